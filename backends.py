@@ -0,0 +1,348 @@
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+from .config import SETTINGS_DB, SETTINGS_FLUSH_INTERVAL, STATE_BACKEND
+
+
+class StateBackend(ABC):
+    remote_blobs = False
+
+    @abstractmethod
+    def load(self, key: str) -> Dict[int, Any]:
+        ...
+
+    @abstractmethod
+    def put(self, user_id: int, key: str, value: Any) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, user_id: int, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def get_value(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set_value(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete_value(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        ...
+
+    @abstractmethod
+    def release_lease(self, name: str, owner: str) -> None:
+        ...
+
+    async def load_async(self, key: str) -> Dict[int, Any]:
+        return self.load(key)
+
+    async def get_value_async(self, key: str) -> Optional[str]:
+        return self.get_value(key)
+
+    async def set_value_async(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self.set_value(key, value, ttl)
+
+    async def delete_value_async(self, key: str) -> None:
+        self.delete_value(key)
+
+    def put_blob(self, digest: str, path: str) -> None:
+        pass
+
+    def fetch_blob(self, digest: str, path: str) -> bool:
+        return os.path.exists(path)
+
+    def delete_blob(self, digest: str) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    async def close_async(self) -> None:
+        pass
+
+
+class MemoryBackend(StateBackend):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._settings: Dict[str, Dict[int, str]] = {}
+        self._values: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._leases: Dict[str, Tuple[str, float]] = {}
+
+    def load(self, key: str) -> Dict[int, Any]:
+        with self._lock:
+            return {user_id: json.loads(value) for user_id, value in self._settings.get(key, {}).items()}
+
+    def put(self, user_id: int, key: str, value: Any) -> None:
+        with self._lock:
+            self._settings.setdefault(key, {})[user_id] = json.dumps(value)
+
+    def delete(self, user_id: int, key: str) -> None:
+        with self._lock:
+            self._settings.get(key, {}).pop(user_id, None)
+
+    def get_value(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+            if item[1] is not None and item[1] <= time.time():
+                del self._values[key]
+                return None
+            return item[0]
+
+    def set_value(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._values[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete_value(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            holder = self._leases.get(name)
+            if holder is not None and holder[0] != owner and holder[1] > now:
+                return False
+            self._leases[name] = (owner, now + ttl)
+            return True
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._lock:
+            if self._leases.get(name, ("",))[0] == owner:
+                del self._leases[name]
+
+
+class SQLiteBackend(StateBackend):
+    def __init__(self, path: str, flush_interval: float):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[int, str], Optional[str]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS settings ("
+                "user_id INTEGER NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (user_id, key)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def load(self, key: str) -> Dict[int, Any]:
+        with self._lock:
+            rows = self._connect().execute("SELECT user_id, value FROM settings WHERE key = ?", (key,)).fetchall()
+            values = dict(rows)
+            for (user_id, pending_key), value in self._pending.items():
+                if pending_key != key:
+                    continue
+                if value is None:
+                    values.pop(user_id, None)
+                else:
+                    values[user_id] = value
+        return {user_id: json.loads(value) for user_id, value in values.items()}
+
+    def put(self, user_id: int, key: str, value: Any) -> None:
+        with self._lock:
+            self._pending[(user_id, key)] = json.dumps(value)
+        self._ensure_flusher()
+
+    def delete(self, user_id: int, key: str) -> None:
+        with self._lock:
+            self._pending[(user_id, key)] = None
+        self._ensure_flusher()
+
+    def get_value(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_value(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO kv (key, value, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires",
+                (key, value, time.time() + ttl if ttl else None),
+            )
+
+    def delete_value(self, key: str) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._connect().execute(
+                "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE leases.owner = excluded.owner OR leases.expires <= ?",
+                (name, owner, now + ttl, now),
+            )
+        return cursor.rowcount == 1
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT INTO settings (user_id, key, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (user_id, key) DO UPDATE SET value = excluded.value",
+                    [(user_id, key, value) for (user_id, key), value in pending.items() if value is not None],
+                )
+                conn.executemany(
+                    "DELETE FROM settings WHERE user_id = ? AND key = ?",
+                    [(user_id, key) for (user_id, key), value in pending.items() if value is None],
+                )
+                conn.execute("COMMIT")
+            except Exception as e:
+                conn.execute("ROLLBACK")
+                pending.update(self._pending)
+                self._pending = pending
+                logging.exception(f"Не удалось сохранить настройки пользователей: {e}")
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="settings-flusher", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+
+
+class RedisBackend(StateBackend):
+    remote_blobs = True
+
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+    _RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+
+    def __init__(self, url: str, prefix: str = "schedule_bot"):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError("Для STATE_BACKEND=redis://... установите пакет redis")
+        self._redis = redis.Redis.from_url(url)
+        self._aredis = redis.asyncio.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    def load(self, key: str) -> Dict[int, Any]:
+        return {int(user_id): json.loads(value) for user_id, value in self._redis.hgetall(self._key("settings", key)).items()}
+
+    def put(self, user_id: int, key: str, value: Any) -> None:
+        self._redis.hset(self._key("settings", key), str(user_id), json.dumps(value))
+
+    def delete(self, user_id: int, key: str) -> None:
+        self._redis.hdel(self._key("settings", key), str(user_id))
+
+    def get_value(self, key: str) -> Optional[str]:
+        value = self._redis.get(self._key("kv", key))
+        return value.decode() if value is not None else None
+
+    def set_value(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._redis.set(self._key("kv", key), value, px=int(ttl * 1000) if ttl else None)
+
+    def delete_value(self, key: str) -> None:
+        self._redis.delete(self._key("kv", key))
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        key = self._key("lease", name)
+        if self._redis.set(key, owner, nx=True, px=int(ttl * 1000)):
+            return True
+        return bool(self._redis.eval(self._RENEW, 1, key, owner, int(ttl * 1000)))
+
+    def release_lease(self, name: str, owner: str) -> None:
+        self._redis.eval(self._RELEASE, 1, self._key("lease", name), owner)
+
+    async def load_async(self, key: str) -> Dict[int, Any]:
+        values = await self._aredis.hgetall(self._key("settings", key))
+        return {int(user_id): json.loads(value) for user_id, value in values.items()}
+
+    async def get_value_async(self, key: str) -> Optional[str]:
+        value = await self._aredis.get(self._key("kv", key))
+        return value.decode() if value is not None else None
+
+    async def set_value_async(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self._aredis.set(self._key("kv", key), value, px=int(ttl * 1000) if ttl else None)
+
+    async def delete_value_async(self, key: str) -> None:
+        await self._aredis.delete(self._key("kv", key))
+
+    async def close_async(self) -> None:
+        await self._aredis.aclose()
+
+    def put_blob(self, digest: str, path: str) -> None:
+        key = self._key("blob", digest)
+        if not self._redis.exists(key):
+            with open(path, "rb") as f:
+                self._redis.set(key, f.read())
+
+    def fetch_blob(self, digest: str, path: str) -> bool:
+        if os.path.exists(path):
+            return True
+        data = self._redis.get(self._key("blob", digest))
+        if data is None:
+            return False
+        tmp_path = f"{path}.{os.getpid()}.fetch"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return True
+
+    def delete_blob(self, digest: str) -> None:
+        self._redis.delete(self._key("blob", digest))
+
+
+def create_backend(spec: str = STATE_BACKEND) -> StateBackend:
+    if spec == "memory":
+        return MemoryBackend()
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(spec)
+    if spec == "sqlite":
+        return SQLiteBackend(SETTINGS_DB, SETTINGS_FLUSH_INTERVAL)
+    raise ValueError(f"Неизвестный STATE_BACKEND: {spec}")
@@ -0,0 +1,67 @@
+import time
+from typing import Any, List, Optional, Tuple
+
+
+class FakeBot:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent: List[Tuple[float, int, str]] = []
+        self.edited: List[Tuple[float, int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs: Any) -> "FakeMessage":
+        if self.latency:
+            import asyncio
+            await asyncio.sleep(self.latency)
+        self.sent.append((time.perf_counter(), chat_id, text))
+        return FakeMessage(self, chat_id, text)
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self, bot: FakeBot, chat_id: int, text: str = "", reply_markup: Any = None):
+        self.bot = bot
+        self.from_user = FakeUser(chat_id)
+        self.chat_id = chat_id
+        self.text = text
+        self.reply_markup = reply_markup
+        self.document = None
+
+    async def edit_text(self, text: str, reply_markup: Any = None, **kwargs: Any) -> "FakeMessage":
+        self.text = text
+        self.reply_markup = reply_markup
+        self.bot.edited.append((time.perf_counter(), self.chat_id, text))
+        return self
+
+    async def edit_reply_markup(self, reply_markup: Any = None, **kwargs: Any) -> "FakeMessage":
+        self.reply_markup = reply_markup
+        return self
+
+    async def answer(self, text: str, reply_markup: Any = None, **kwargs: Any) -> "FakeMessage":
+        return await self.bot.send_message(self.chat_id, text, reply_markup=reply_markup)
+
+    async def reply(self, text: str, **kwargs: Any) -> "FakeMessage":
+        return await self.bot.send_message(self.chat_id, text)
+
+
+class FakeCallback:
+    def __init__(self, bot: FakeBot, user_id: int, data: str, message: Optional[FakeMessage] = None):
+        self.from_user = FakeUser(user_id)
+        self.data = data
+        self.message = message or FakeMessage(bot, user_id)
+        self.answers: List[str] = []
+
+    async def answer(self, text: Optional[str] = None, **kwargs: Any) -> bool:
+        self.answers.append(text or "")
+        return True
+
+
+def navigation_targets(message: FakeMessage) -> List[str]:
+    markup = message.reply_markup
+    if markup is None:
+        return []
+    return [button.callback_data for row in markup.inline_keyboard for button in row
+            if button.callback_data and button.callback_data.startswith("day_")]
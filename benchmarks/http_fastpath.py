@@ -0,0 +1,116 @@
+import asyncio
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+
+from .. import parser
+
+CSV_BODY = "Plan;;;\n;;;\nData;Czas od;Czas do\n".encode("utf-8") + b"x;8:00;9:30\n" * 2000
+HTML_BODY = b"<html><body>Sesja wygasla</body></html>"
+
+
+class StandInServer:
+    def __init__(self):
+        self.hits = {"csv": 0, "html": 0, "page": 0}
+
+    async def csv(self, request: web.Request) -> web.Response:
+        self.hits["csv"] += 1
+        if request.cookies.get("session") != "ok":
+            return web.Response(status=403)
+        return web.Response(body=CSV_BODY, content_type="text/csv")
+
+    async def html(self, request: web.Request) -> web.Response:
+        self.hits["html"] += 1
+        return web.Response(body=HTML_BODY, content_type="text/html")
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/export.csv", self.csv)
+        app.router.add_get("/expired", self.html)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+
+class StandInBrowser:
+    def __init__(self, server: StandInServer, export_url: str):
+        self.server = server
+        self.export_url = export_url
+        self.calls = 0
+        self.cached_on_call = []
+
+    @asynccontextmanager
+    async def page(self, on_position=None):
+        yield None
+
+    async def download(self, page, url: str, save_path: str) -> str:
+        self.calls += 1
+        self.server.hits["page"] += 1
+        self.cached_on_call.append(parser.canonical_schedule_url(url) in parser._export_urls)
+        parser._export_urls[parser.canonical_schedule_url(url)] = (self.export_url, {"session": "ok"})
+        with open(save_path, "wb") as f:
+            f.write(CSV_BODY)
+        return save_path
+
+
+def _leftovers(directory: str):
+    return [name for name in os.listdir(directory) if name.endswith(".part")]
+
+
+async def run() -> None:
+    server = StandInServer()
+    base = await server.start()
+    browser = StandInBrowser(server, f"{base}/export.csv")
+    parser.browser_pool = browser
+    parser._download_with_page = browser.download
+    workdir = tempfile.mkdtemp(prefix="schedule_bot_http_")
+    save_path = os.path.join(workdir, "plan.csv")
+    url = f"{base}/plan#semester"
+    key = parser.canonical_schedule_url(url)
+
+    try:
+        await parser.download_schedule(url, save_path)
+        assert browser.calls == 1 and key in parser._export_urls, "first download must go through the browser"
+
+        os.remove(save_path)
+        await parser.download_schedule(url, save_path)
+        assert browser.calls == 1 and server.hits["csv"] == 1, "second download must use the HTTP fast path"
+        with open(save_path, "rb") as f:
+            assert f.read() == CSV_BODY, "fast path wrote a different body"
+        assert not _leftovers(workdir), "temporary .part file left behind"
+        print("ok: fast path reused the captured export URL and wrote the CSV")
+
+        parser._export_urls[key] = (f"{base}/expired", {"session": "ok"})
+        with open(save_path, "wb") as f:
+            f.write(b"previous")
+        try:
+            await parser._download_over_http(f"{base}/expired", {}, save_path)
+            raise AssertionError("HTML error page was accepted as CSV")
+        except ValueError:
+            pass
+        with open(save_path, "rb") as f:
+            assert f.read() == b"previous", "rejected response overwrote the existing file"
+        assert not _leftovers(workdir), "temporary .part file left behind"
+        print("ok: HTML error page rejected without touching the existing file")
+
+        await parser.download_schedule(url, save_path)
+        assert server.hits["html"] == 2, "fast path was not attempted"
+        assert browser.calls == 2, "no fallback to the browser path"
+        assert browser.cached_on_call[-1] is False, "failed export URL was not dropped before the fallback"
+        assert parser._export_urls[key][0].endswith("/export.csv"), "stale export URL was not replaced"
+        with open(save_path, "rb") as f:
+            assert f.read() == CSV_BODY
+        print("ok: non-CSV response dropped the export URL and fell back to the browser")
+    finally:
+        if parser._http_session is not None:
+            await parser._http_session.close()
+        await server.runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
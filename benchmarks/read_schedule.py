@@ -0,0 +1,66 @@
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from .synthetic import write_synthetic_schedule
+from ..binformat import decode, encode
+from ..schedules import Lesson, ScheduleIndex, _parse_schedule_file
+
+
+def _legacy_forward_fill(df: pd.DataFrame) -> list:
+    current_date = None
+    dates = []
+    for _, row in df.iterrows():
+        first_col = str(row.iloc[0]).strip() if pd.notna(row.iloc[0]) else ""
+        if first_col.startswith("Data Zajec"):
+            try:
+                current_date = datetime.strptime(first_col.split()[2], "%Y.%m.%d").date()
+            except Exception:
+                current_date = None
+            dates.append(None)
+        else:
+            dates.append(current_date)
+    return dates
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(days: int = 1000, lessons_per_day: int = 8, repeat: int = 5) -> None:
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_synthetic_schedule(os.path.join(tmp, "Plany.csv"), days, lessons_per_day)
+        csv_size = os.path.getsize(path)
+        raw = pd.read_csv(path, sep=';', skiprows=2, header=None, skipinitialspace=True).dropna(how="all")
+
+        legacy = _best_of(lambda: _legacy_forward_fill(raw), repeat)
+        parse = _best_of(lambda: _parse_schedule_file(path, 0), repeat)
+
+        df = _parse_schedule_file(path, 0)
+        index = ScheduleIndex.from_frame(df)
+        blob = encode(index.iter_lessons())
+        compiled = _best_of(lambda: ScheduleIndex.from_lessons(map(Lesson._make, decode(blob))), repeat)
+        assert list(ScheduleIndex.from_lessons(map(Lesson._make, decode(blob))).iter_lessons()) == list(index.iter_lessons())
+
+        expected = [d for d in _legacy_forward_fill(raw) if d is not None]
+        assert df["Data_dt"].tolist() == expected, "vectorized Data_dt differs from iterrows result"
+
+    print(f"rows: {len(raw)}")
+    print(f"iterrows forward-fill only: {legacy * 1000:.1f} ms")
+    print(f"full vectorized parse:      {parse * 1000:.1f} ms")
+    print(f"compiled index load:        {compiled * 1000:.1f} ms ({len(blob)} bytes vs {csv_size} bytes CSV)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, List
+
+from .synthetic import write_synthetic_schedule
+
+SIZES = {
+    "small": (30, 4),
+    "semester": (120, 6),
+    "large": (365, 10),
+}
+
+
+def _report(name: str, latencies: List[float], elapsed: float) -> None:
+    ordered = sorted(latencies)
+
+    def pct(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else 0.0
+
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{name:<22} ops={len(latencies):<6} {len(latencies) / elapsed if elapsed else 0:>9.1f} ops/s  "
+          f"p50={pct(0.5):7.2f} ms  p99={pct(0.99):7.2f} ms  peak_rss={rss_mb:.0f} MB")
+
+
+async def _timed_ops(name: str, ops: List[Callable]) -> None:
+    latencies = []
+    started = time.perf_counter()
+    for op in ops:
+        op_started = time.perf_counter()
+        await op()
+        latencies.append(time.perf_counter() - op_started)
+    _report(name, latencies, time.perf_counter() - started)
+
+
+async def run(users: int, distinct: int, size: str) -> None:
+    from .fake_bot import FakeBot, FakeCallback, navigation_targets
+    from .. import handlers, schedules, storage
+    from ..notifier import reminder_scheduler
+    from ..ratelimit import RateLimitedSender
+    from .. import notifier
+
+    days, per_day = SIZES[size]
+    today = date.today()
+    sources = []
+    for idx in range(distinct):
+        path = os.path.join(tempfile.gettempdir(), f"bench_source_{os.getpid()}_{idx}.csv")
+        sources.append(write_synthetic_schedule(path, days, per_day, start=today - timedelta(days=days // 2), seed=idx))
+    for user_id in range(1, users + 1):
+        with open(sources[user_id % distinct], "rb") as src, open(storage.get_user_schedule_file(user_id), "wb") as dst:
+            dst.write(src.read())
+
+    bot = FakeBot()
+
+    await _timed_ops("cold parse (csv)", [
+        (lambda uid=uid: schedules.load_schedule_index(uid)) for uid in range(1, users + 1)])
+
+    for uid in range(1, users + 1):
+        schedules.invalidate_schedule(uid)
+    await _timed_ops("cold load (compiled)", [
+        (lambda uid=uid: schedules.load_schedule_index(uid)) for uid in range(1, users + 1)])
+
+    async def browse(uid: int) -> None:
+        callback = FakeCallback(bot, uid, "show_today")
+        await handlers.show_schedule_callback(callback)
+        callback = FakeCallback(bot, uid, "show_month", callback.message)
+        await handlers.show_schedule_callback(callback)
+        for _ in range(5):
+            targets = navigation_targets(callback.message)
+            if not targets:
+                break
+            callback = FakeCallback(bot, uid, targets[-1], callback.message)
+            await handlers.navigate_day(callback)
+
+    await _timed_ops("navigate (7 taps)", [(lambda uid=uid: browse(uid)) for uid in range(1, users + 1)])
+
+    async def toggle_group(uid: int) -> None:
+        await handlers.toggle_group(FakeCallback(bot, uid, "toggle_group"))
+
+    await _timed_ops("toggle group filter", [(lambda uid=uid: toggle_group(uid)) for uid in range(1, users + 1)])
+
+    for uid in range(1, users + 1):
+        storage.user_notifications[uid] = True
+    reminder_scheduler.running = True
+    await _timed_ops("rebuild reminders", [lambda: reminder_scheduler.rebuild_all()])
+
+    notifier.sender = RateLimitedSender(workers=16, global_rate=1e6, per_chat_rate=1e6)
+    notifier.sender.start(bot)
+    first_slot = datetime.combine(today, datetime.min.time()) + timedelta(hours=8) - reminder_scheduler.lead
+    due = reminder_scheduler._pop_due(first_slot)
+    sent_before = len(bot.sent)
+    started = time.perf_counter()
+    await reminder_scheduler._dispatch(due)
+    while len(bot.sent) - sent_before < len({user_id for _, user_id, _ in due}):
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    _report("reminder fan-out", [t - started for t, _, _ in bot.sent[sent_before:]], elapsed)
+    await notifier.sender.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Schedule bot benchmark scenarios")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=10, help="number of distinct schedule files")
+    parser.add_argument("--size", choices=sorted(SIZES), default="semester")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix="schedule_bot_bench_")
+    os.chdir(workdir)
+    os.environ.setdefault("SETTINGS_DB", os.path.join(workdir, "settings.db"))
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+    os.environ.setdefault("METRICS_PORT", "0")
+    print(f"users={args.users} distinct={args.distinct} size={args.size} workdir={workdir}")
+    asyncio.run(run(args.users, args.distinct, args.size))
+
+
+if __name__ == "__main__":
+    main()
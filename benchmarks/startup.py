@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ("pandas", "numpy", "playwright")
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+import package.bot
+elapsed = time.perf_counter() - started
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(f"{{elapsed:.3f}} {{','.join(heavy) or '-'}}")
+"""
+
+
+def measure(runs: int) -> None:
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    workdir = tempfile.mkdtemp(prefix="schedule_bot_startup_")
+    env = dict(os.environ, BOT_TOKEN="123456:BENCHMARK", SETTINGS_DB=os.path.join(workdir, "settings.db"),
+               PYTHONPATH=root)
+    timings = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES)], env=env, cwd=workdir,
+                             capture_output=True, text=True, check=True).stdout.split()
+        timings.append(float(out[0]))
+        heavy = out[1]
+    timings.sort()
+    print(f"import package.bot: min={timings[0] * 1000:.0f} ms  median={timings[len(timings) // 2] * 1000:.0f} ms  "
+          f"heavy modules loaded: {heavy}")
+
+    profile = subprocess.run([sys.executable, "-X", "importtime", "-c", "import package.bot"], env=env, cwd=workdir,
+                             capture_output=True, text=True, check=True).stderr.splitlines()
+    rows = []
+    for line in profile[1:]:
+        _, cumulative_us, name = line.replace("import time:", "").split("|")
+        if name.startswith(" " * 5):
+            continue
+        rows.append((int(cumulative_us), name.strip()))
+    print("slowest top-level imports (cumulative):")
+    for cumulative_us, name in sorted(rows, reverse=True)[:10]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    measure(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,33 @@
+import random
+from datetime import date, timedelta
+
+WEEKDAYS = ["poniedzialek", "wtorek", "sroda", "czwartek", "piatek", "sobota", "niedziela"]
+SUBJECTS = ["Psychologia rozwoju", "Statystyka", "Zajecia z tutorem", "Metodologia badan",
+            "Psychologia spoleczna", "Neuropsychologia", "Jezyk angielski"]
+SLOTS = [("8:00", "9:30"), ("9:45", "11:15"), ("11:30", "13:00"),
+         ("13:15", "14:45"), ("15:00", "16:30"), ("16:45", "18:15")]
+
+
+def write_synthetic_schedule(path: str, days: int = 120, lessons_per_day: int = 6,
+                             start: date = date(2025, 10, 1), seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    lines = [
+        ";;;;;;;;;sobota, 27 wrzesnia 2025",
+        "Plan dla toku: Psychologia S Jmgr 5.00 2025/2026 Zima;;;;;;;;;",
+        "Czas od;;Czas do;Liczba godzin;Grupy;Zajecia;Sala;Forma zaliczenia;Uwagi;",
+    ]
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        lines.append(f"Data Zajec: {day:%Y.%m.%d} {WEEKDAYS[day.weekday()]} ;;;;;;;;;")
+        for slot in range(lessons_per_day):
+            od, do = SLOTS[slot % len(SLOTS)]
+            if rnd.random() < 0.3:
+                grupy = "Psychologia Jmgr 1sem WykS "
+            else:
+                grupy = f"Psychologia Jmgr 1sem Cw{rnd.randint(1, 3)}S "
+            uwagi = "zdalnie" if rnd.random() < 0.1 else ""
+            lines.append(f";{od};{do};1h30m;{grupy};{rnd.choice(SUBJECTS)} ;S47 {rnd.randint(100, 420)} ;"
+                         f"Nie dotyczy;{uwagi};")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
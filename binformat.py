@@ -0,0 +1,112 @@
+import logging
+import mmap
+import os
+import struct
+import sys
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import COMPILED_SCHEDULES_DIR
+
+
+MAGIC = b"SCHB"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHII")
+_OFFSET = struct.Struct("<I")
+_RECORD = struct.Struct("<IiiIIIIII")
+
+LessonFields = Tuple[date, Optional[timedelta], Optional[timedelta], str, str, str, str, str, str]
+
+
+def get_compiled_path(version: str) -> str:
+    os.makedirs(COMPILED_SCHEDULES_DIR, exist_ok=True)
+    return os.path.join(COMPILED_SCHEDULES_DIR, f"{version}.bin")
+
+
+def _seconds(value: Optional[timedelta]) -> int:
+    return -1 if value is None else int(value.total_seconds())
+
+
+def _timedelta(value: int) -> Optional[timedelta]:
+    return None if value < 0 else timedelta(seconds=value)
+
+
+def encode(lessons: Iterable[Sequence]) -> bytes:
+    strings: List[str] = []
+    ids: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        idx = ids.get(value)
+        if idx is None:
+            idx = ids[value] = len(strings)
+            strings.append(value)
+        return idx
+
+    records = bytearray()
+    count = 0
+    for day, start, end, *texts in lessons:
+        records += _RECORD.pack(day.toordinal(), _seconds(start), _seconds(end), *(intern(t) for t in texts))
+        count += 1
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = bytearray()
+    position = 0
+    for chunk in encoded:
+        offsets += _OFFSET.pack(position)
+        position += len(chunk)
+    offsets += _OFFSET.pack(position)
+
+    return b"".join([_HEADER.pack(MAGIC, FORMAT_VERSION, len(strings), count), bytes(offsets), *encoded, bytes(records)])
+
+
+def decode(buffer) -> Optional[List[LessonFields]]:
+    view = memoryview(buffer)
+    if len(view) < _HEADER.size:
+        return None
+    magic, version, n_strings, n_records = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return None
+
+    offsets_start = _HEADER.size
+    strings_start = offsets_start + _OFFSET.size * (n_strings + 1)
+    offsets = [value for (value,) in _OFFSET.iter_unpack(view[offsets_start:strings_start])]
+    records_start = strings_start + offsets[-1]
+    if len(view) != records_start + _RECORD.size * n_records:
+        return None
+
+    strings = [sys.intern(str(view[strings_start + offsets[i]:strings_start + offsets[i + 1]], "utf-8"))
+               for i in range(n_strings)]
+
+    lessons: List[LessonFields] = []
+    fromordinal = date.fromordinal
+    for ordinal, start, end, *text_ids in _RECORD.iter_unpack(view[records_start:]):
+        lessons.append((fromordinal(ordinal), _timedelta(start), _timedelta(end), *(strings[i] for i in text_ids)))
+    return lessons
+
+
+def write_compiled(version: str, lessons: Iterable[Sequence]) -> str:
+    path = get_compiled_path(version)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(encode(lessons))
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_compiled(version: str) -> Optional[List[LessonFields]]:
+    path = get_compiled_path(version)
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                lessons = decode(mapped)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Не удалось прочитать скомпилированное расписание {path}: {e}")
+        return None
+    if lessons is None:
+        logging.info(f"Скомпилированное расписание {path} устарело, будет пересобрано из CSV")
+    return lessons
@@ -1,17 +1,92 @@
 import asyncio
 import logging
+import signal
+import time
+
+_import_started = time.perf_counter()
 from aiogram import Bot, Dispatcher
-from config import BOT_TOKEN
+from .config import (BOT_TOKEN, BOT_MODE, MAX_CONCURRENT_UPDATES, SHUTDOWN_TIMEOUT, WARMUP_CONCURRENCY,
+                     WARMUP_SCHEDULES)
+from .storage import fsm_storage
 
 bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
+dp = Dispatcher(storage=fsm_storage)
+
+from . import handlers
+
+from .notifier import send_notifications
+from .refresher import refresh_schedules
+from .digest import run_digests
+from .executor import monitor_loop_lag, shutdown_executor
+from .metrics import start_metrics_server, startup_seconds
+from .parser import close_downloads
+from .ratelimit import sender
+from .webhook import run_webhook, start_health_server
+from .leader import LeaderLease
+from .schedules import warm_up_schedules
+from .storage import state_backend, user_notifications
+
+startup_seconds.set(time.perf_counter() - _import_started, phase="imports")
+
+
+def _startup_phase(phase: str) -> None:
+    elapsed = time.perf_counter() - _import_started
+    startup_seconds.set(elapsed, phase=phase)
+    logging.info(f"Старт: {phase} через {elapsed:.2f}s")
+
+
+@dp.startup()
+async def on_startup():
+    _startup_phase("ready")
+
+
+async def warm_up():
+    started = time.perf_counter()
+    user_ids = [user_id for user_id, enabled in list(user_notifications.items()) if enabled]
+    warmed = await warm_up_schedules(user_ids, WARMUP_CONCURRENCY)
+    logging.info(f"Прогрето {warmed} из {len(user_ids)} расписаний за {time.perf_counter() - started:.2f}s")
+
+
+async def run_leader_tasks():
+    await asyncio.gather(send_notifications(bot), refresh_schedules(bot), run_digests(bot))
 
-import handlers
 
-from notifier import send_notifications
+async def stop_background_tasks(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await sender.stop(drain_timeout=SHUTDOWN_TIMEOUT)
 
 
 async def main():
-    logging.info("Starting bot...")
-    asyncio.create_task(send_notifications(bot))
-    await dp.start_polling(bot)
+    logging.info(f"Starting bot ({BOT_MODE})...")
+    _startup_phase("main")
+    metrics_runner = await start_metrics_server()
+    tasks = [
+        asyncio.create_task(LeaderLease("background").run(run_leader_tasks)),
+        asyncio.create_task(monitor_loop_lag()),
+    ]
+    if WARMUP_SCHEDULES:
+        tasks.append(asyncio.create_task(warm_up()))
+    health_runner = None
+    try:
+        if BOT_MODE == "webhook":
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, stop.set)
+            await run_webhook(dp, bot, stop)
+        else:
+            health_runner = await start_health_server()
+            await bot.delete_webhook()
+            await dp.start_polling(bot, tasks_concurrency_limit=MAX_CONCURRENT_UPDATES, close_bot_session=False)
+    finally:
+        logging.info("Остановка фоновых задач...")
+        await stop_background_tasks(tasks)
+        await close_downloads()
+        shutdown_executor()
+        await state_backend.close_async()
+        for runner in (health_runner, metrics_runner):
+            if runner is not None:
+                await runner.cleanup()
+        await bot.session.close()
@@ -1,8 +1,58 @@
 import os
+import socket
 import logging
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 USER_SCHEDULES_DIR = "user_schedules"
 SCHEDULE_FILE = 'Plany.csv'
+SCHEDULE_BLOBS_DIR = os.path.join(USER_SCHEDULES_DIR, "blobs")
+COMPILED_SCHEDULES_DIR = os.path.join(USER_SCHEDULES_DIR, "compiled")
+SETTINGS_DB = os.getenv("SETTINGS_DB", os.path.join(USER_SCHEDULES_DIR, "settings.db"))
+SETTINGS_FLUSH_INTERVAL = float(os.getenv("SETTINGS_FLUSH_INTERVAL", "1"))
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "0" if STATE_BACKEND in ("sqlite", "memory") else "5"))
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", "86400"))
+REPLICA_ID = os.getenv("REPLICA_ID", f"{socket.gethostname()}-{os.getpid()}")
+LEADER_LEASE_TTL = float(os.getenv("LEADER_LEASE_TTL", "30"))
+NOTIFIER_RESYNC_INTERVAL = float(os.getenv("NOTIFIER_RESYNC_INTERVAL", "0" if STATE_BACKEND in ("sqlite", "memory") else "60"))
+SCHEDULE_CACHE_SIZE = int(os.getenv("SCHEDULE_CACHE_SIZE", "256"))
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "4096"))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "4"))
+PARSE_QUEUE_SIZE = int(os.getenv("PARSE_QUEUE_SIZE", "64"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+LOOP_LAG_WARN = float(os.getenv("LOOP_LAG_WARN", "0.25"))
+REMINDER_LEAD_MINUTES = int(os.getenv("REMINDER_LEAD_MINUTES", "5"))
+DIGEST_HOURS = [int(hour) for hour in os.getenv("DIGEST_HOURS", "6,7,8,9").split(",") if hour.strip()]
+DIGEST_WINDOW = float(os.getenv("DIGEST_WINDOW", "900"))
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", "8"))
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", "10000"))
+SEND_RATE_GLOBAL = float(os.getenv("SEND_RATE_GLOBAL", "25"))
+SEND_RATE_PER_CHAT = float(os.getenv("SEND_RATE_PER_CHAT", "1"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+BROWSER_MAX_CONTEXTS = int(os.getenv("BROWSER_MAX_CONTEXTS", "2"))
+BROWSER_CONTEXT_MAX_USES = int(os.getenv("BROWSER_CONTEXT_MAX_USES", "20"))
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "180"))
+HTTP_DOWNLOAD_TIMEOUT = float(os.getenv("HTTP_DOWNLOAD_TIMEOUT", "30"))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "65536"))
+SCHEDULE_DOWNLOAD_TTL = float(os.getenv("SCHEDULE_DOWNLOAD_TTL", "600"))
+BLOB_GC_MIN_AGE = float(os.getenv("BLOB_GC_MIN_AGE", "86400"))
+REFRESH_INTERVAL = float(os.getenv("REFRESH_INTERVAL", "21600"))
+REFRESH_JITTER = float(os.getenv("REFRESH_JITTER", "0.2"))
+REFRESH_CONCURRENCY = int(os.getenv("REFRESH_CONCURRENCY", "2"))
+REFRESH_NOTIFY_CHANGES = os.getenv("REFRESH_NOTIFY_CHANGES", "1") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+BOT_MODE = os.getenv("BOT_MODE", "webhook" if os.getenv("WEBHOOK_URL") else "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8080")))
+HEALTH_PORT = int(os.getenv("PORT", "0"))
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "32"))
+WARMUP_SCHEDULES = os.getenv("WARMUP_SCHEDULES", "1") == "1"
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "2"))
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "25"))
 
 logging.basicConfig(level=logging.INFO)
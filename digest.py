@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .config import DIGEST_WINDOW, LEADER_LEASE_TTL, REPLICA_ID
+from .metrics import digests_sent
+from .ratelimit import latency_summary, sender
+from .schedules import ScheduleIndex, format_day, load_schedule_index
+from .storage import state_backend, user_digest_hours, user_groups, user_schedule_versions
+
+DigestKey = Tuple[str, int]
+
+
+def format_digest(text: str) -> str:
+    return f"☀️ Доброе утро! {text}"
+
+
+async def _group_users(user_ids: List[int]) -> Dict[DigestKey, List[int]]:
+    groups: Dict[DigestKey, List[int]] = {}
+    for user_id in user_ids:
+        version = user_schedule_versions.get(user_id)
+        if version is None:
+            version = (await load_schedule_index(user_id)).version
+        if version is not None:
+            groups.setdefault((version, user_groups.get(user_id, 0)), []).append(user_id)
+    return groups
+
+
+async def render_digests(user_ids: List[int], day: date) -> Dict[int, str]:
+    texts: Dict[int, str] = {}
+    for (version, group_num), members in (await _group_users(user_ids)).items():
+        index: Optional[ScheduleIndex] = None
+        for user_id in members:
+            index = await load_schedule_index(user_id)
+            if index:
+                break
+        if not index or not index.lessons_for(day, group_num):
+            continue
+        text = format_digest(format_day(index, day, members[0]))
+        for user_id in members:
+            texts[user_id] = text
+    return texts
+
+
+async def send_digest(hour: int, day: date, started: float, window: float = DIGEST_WINDOW) -> None:
+    user_ids = sorted(user_id for user_id, digest_hour in list(user_digest_hours.items()) if digest_hour == hour)
+    if not user_ids:
+        return
+    marker = f"digest:{day.isoformat()}:{hour}"
+    if state_backend.get_value(marker) or not state_backend.acquire_lease(marker, REPLICA_ID, LEADER_LEASE_TTL):
+        return
+
+    futures = []
+    try:
+        render_started = time.monotonic()
+        texts = await render_digests(user_ids, day)
+        logging.info(f"Сводка на {day:%d.%m.%Y} {hour:02d}:00: {len(texts)} из {len(user_ids)} пользователей, "
+                     f"{len(set(texts.values()))} уникальных текстов, рендер {time.monotonic() - render_started:.2f}s")
+
+        step = window / len(texts) if texts else 0
+        for position, (user_id, text) in enumerate(sorted(texts.items())):
+            user_marker = f"{marker}:{user_id}"
+            if await state_backend.get_value_async(user_marker):
+                continue
+            due = started + position * step
+            delay = due - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if not state_backend.acquire_lease(marker, REPLICA_ID, LEADER_LEASE_TTL):
+                logging.warning(f"Сводка {hour:02d}:00 перехвачена другой репликой")
+                break
+            await state_backend.set_value_async(user_marker, "1", ttl=2 * 86400)
+            futures.append(await sender.send(user_id, text, due=due))
+        else:
+            state_backend.set_value(marker, "1", ttl=2 * 86400)
+    finally:
+        state_backend.release_lease(marker, REPLICA_ID)
+
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    for result in results:
+        digests_sent.inc(outcome="delivered" if isinstance(result, float) else "failed")
+    delivered, failed, summary = latency_summary(results)
+    logging.info(f"Сводка {hour:02d}:00: доставлено {delivered}, ошибок {failed}, задержка {summary}")
+
+
+async def run_digests(bot, window: float = DIGEST_WINDOW) -> None:
+    sender.start(bot)
+    slot = datetime.now().replace(minute=0, second=0, microsecond=0)
+    if datetime.now() - slot > timedelta(seconds=window):
+        slot += timedelta(hours=1)
+    while True:
+        delay = (slot - datetime.now()).total_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await send_digest(slot.hour, slot.date(), slot.timestamp(), window)
+        except Exception as e:
+            logging.exception(f"Ошибка рассылки сводки {slot:%d.%m.%Y %H:%M}: {e}")
+        slot += timedelta(hours=1)
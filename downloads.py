@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from .config import SCHEDULE_BLOBS_DIR, SCHEDULE_DOWNLOAD_TTL
+from .parser import PositionCallback, canonical_schedule_url, download_schedule
+from .storage import store_blob
+
+
+class SharedDownloads:
+    def __init__(self, ttl: float = SCHEDULE_DOWNLOAD_TTL):
+        self.ttl = ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._fresh: Dict[str, Tuple[str, float]] = {}
+
+    def fresh_digest(self, url: str) -> Optional[str]:
+        cached = self._fresh.get(canonical_schedule_url(url))
+        if cached is not None and time.monotonic() - cached[1] < self.ttl:
+            return cached[0]
+        return None
+
+    async def fetch(self, url: str, on_position: Optional[PositionCallback] = None, force: bool = False) -> str:
+        key = canonical_schedule_url(url)
+
+        if not force:
+            digest = self.fresh_digest(key)
+            if digest is not None:
+                return digest
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            digest = await self._download(key, on_position)
+            self._fresh[key] = (digest, time.monotonic())
+            future.set_result(digest)
+            return digest
+        except BaseException as e:
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("загрузка прервана"))
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _download(self, url: str, on_position: Optional[PositionCallback]) -> str:
+        os.makedirs(SCHEDULE_BLOBS_DIR, exist_ok=True)
+        tmp_path = os.path.join(SCHEDULE_BLOBS_DIR, f"{uuid.uuid4().hex}.download")
+        try:
+            await download_schedule(url, tmp_path, on_position=on_position)
+            digest = store_blob(tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logging.info(f"Расписание {url} загружено, версия {digest[:12]}")
+        return digest
+
+
+shared_downloads = SharedDownloads()
@@ -0,0 +1,72 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from .config import LOOP_LAG_INTERVAL, LOOP_LAG_WARN, PARSE_QUEUE_SIZE, PARSE_WORKERS
+from .metrics import loop_lag_seconds
+
+
+_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="schedule-worker")
+_slots: Optional[asyncio.Semaphore] = None
+_inflight: Dict[Hashable, asyncio.Future] = {}
+
+executor_stats: Dict[str, int] = {"submitted": 0, "coalesced": 0, "queued": 0}
+loop_lag_stats: Dict[str, float] = {"last": 0.0, "max": 0.0, "p99": 0.0}
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(PARSE_QUEUE_SIZE)
+    return _slots
+
+
+async def _run(fn: Callable[..., Any], args: tuple) -> Any:
+    slots = _get_slots()
+    if slots.locked():
+        executor_stats["queued"] += 1
+    async with slots:
+        executor_stats["submitted"] += 1
+        return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(fn, *args))
+
+
+async def run_blocking(key: Optional[Hashable], fn: Callable[..., Any], *args: Any) -> Any:
+    if key is None:
+        return await _run(fn, args)
+
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        executor_stats["coalesced"] += 1
+        return await asyncio.shield(inflight)
+
+    future = asyncio.ensure_future(_run(fn, args))
+    _inflight[key] = future
+    future.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(future)
+
+
+async def monitor_loop_lag(interval: float = LOOP_LAG_INTERVAL, warn: float = LOOP_LAG_WARN) -> None:
+    samples: List[float] = []
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(time.perf_counter() - started - interval, 0.0)
+
+        samples.append(lag)
+        if len(samples) > 600:
+            del samples[:len(samples) - 600]
+        loop_lag_stats["last"] = lag
+        loop_lag_stats["max"] = max(loop_lag_stats["max"], lag)
+        loop_lag_stats["p99"] = sorted(samples)[int(0.99 * (len(samples) - 1))]
+        for stat, value in loop_lag_stats.items():
+            loop_lag_seconds.set(value, stat=stat)
+
+        if lag > warn:
+            logging.warning(f"Event loop был заблокирован на {lag * 1000:.0f} мс")
+
+
+def shutdown_executor() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -1,6 +1,4 @@
-import os
 import logging
-import pandas as pd
 from datetime import datetime, timedelta
 
 from aiogram import types, F
@@ -10,10 +8,21 @@ from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import Message
 
 from .bot import bot, dp
+from .config import DIGEST_HOURS
 from .keyboards import get_main_keyboard, get_back_keyboard, get_day_navigation_keyboard
-from .schedules import get_schedule_data_for_day, format_schedule, read_schedule, parse_group_info
-from .parser import download_schedule
-from .storage import get_user_schedule_file, user_groups, user_notifications
+from .schedules import (invalidate_schedule, load_schedule_index, load_version_index, load_day_view, load_month_view,
+                        month_bounds)
+from .downloads import shared_downloads
+from .ingest import UploadRejected, ingest_schedule_upload
+from .metrics import MetricsMiddleware
+from .parser import canonical_schedule_url
+from .notifier import reminder_scheduler
+from .updates import apply_schedule_update, summarize_update
+from .storage import link_user_schedule, user_digest_hours, user_groups, user_notifications, user_sources
+
+
+dp.message.middleware(MetricsMiddleware("message"))
+dp.callback_query.middleware(MetricsMiddleware("callback_query"))
 
 
 class ScheduleStates(StatesGroup):
@@ -39,10 +48,14 @@ async def handle_file_upload(message: Message):
     if document.file_name.lower().endswith('.csv'):
         try:
             file = await bot.get_file(document.file_id)
-            file_path = get_user_schedule_file(user_id)
-            await bot.download_file(file.file_path, file_path)
-            await message.reply("✅ Ваш файл расписания успешно обновлен!")
+            old_index = await load_schedule_index(user_id)
+            new_index = await ingest_schedule_upload(bot, file.file_path, user_id, document.file_size or 0)
+            user_sources.pop(user_id, None)
+            summary = summarize_update(user_id, old_index, apply_schedule_update(user_id, old_index, new_index))
+            await message.reply("✅ Ваш файл расписания успешно обновлен!" + (f"\n\n{summary}" if summary else ""))
             await send_welcome(message)
+        except UploadRejected as e:
+            await message.reply(f"❌ Файл не принят: {e}")
         except Exception as e:
             logging.error(f"Ошибка сохранения файла: {e}")
             await message.reply(f"❌ Не удалось сохранить файл. Ошибка: {e}")
@@ -59,38 +72,25 @@ async def show_schedule_callback(callback: types.CallbackQuery):
     today = datetime.now().date()
 
     if timeframe == 'today':
-        text = await get_schedule_data_for_day(today, user_id)
-        keyboard = get_day_navigation_keyboard(today, today, today)
-        await callback.message.edit_text(text, reply_markup=keyboard)
+        view = await load_day_view(user_id, today, today, today)
+        keyboard = get_day_navigation_keyboard(view.prev_day, view.next_day)
+        await callback.message.edit_text(view.text, reply_markup=keyboard)
 
     elif timeframe == 'tomorrow':
         date = today + timedelta(days=1)
-        text = await get_schedule_data_for_day(date, user_id)
-        min_d = date.replace(day=1)
-        if date.month == 12:
-            max_d = date.replace(year=date.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            max_d = date.replace(month=date.month + 1, day=1) - timedelta(days=1)
-        keyboard = get_day_navigation_keyboard(date, min_d, max_d)
-        await callback.message.edit_text(text, reply_markup=keyboard)
+        view = await load_day_view(user_id, date, *month_bounds(date))
+        keyboard = get_day_navigation_keyboard(view.prev_day, view.next_day)
+        await callback.message.edit_text(view.text, reply_markup=keyboard)
 
     elif timeframe in ['month', 'next_month']:
         if timeframe == 'month':
             first_day = today.replace(day=1)
         else:
-            if today.month == 12:
-                first_day = today.replace(year=today.year + 1, month=1, day=1)
-            else:
-                first_day = today.replace(month=today.month + 1, day=1)
+            first_day = month_bounds(today)[1] + timedelta(days=1)
 
-        if first_day.month == 12:
-            last_day = first_day.replace(year=first_day.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            last_day = first_day.replace(month=first_day.month + 1, day=1) - timedelta(days=1)
-
-        text = await get_schedule_data_for_day(first_day, user_id)
-        keyboard = get_day_navigation_keyboard(first_day, first_day, last_day)
-        await callback.message.edit_text(text, reply_markup=keyboard)
+        view = await load_month_view(user_id, first_day)
+        keyboard = get_day_navigation_keyboard(view.prev_day, view.next_day)
+        await callback.message.edit_text(view.text, reply_markup=keyboard)
 
     else:
         await callback.message.edit_text(
@@ -111,6 +111,7 @@ async def toggle_group(callback: types.CallbackQuery):
     current_group = user_groups.get(user_id, 0)
     new_group = (current_group + 1) % 4
     user_groups[user_id] = new_group
+    await reminder_scheduler.refresh_user(user_id)
 
     keyboard = get_main_keyboard(user_id)
     await callback.message.edit_reply_markup(reply_markup=keyboard)
@@ -126,19 +127,26 @@ async def get_schedule_url(message: types.Message, state: FSMContext):
 
     try:
         user_id = message.from_user.id
-        file_name = f"{user_id}.csv"
-        file_path = get_user_schedule_file(user_id)
 
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        async def report_position(position: int) -> None:
+            try:
+                await status_message.edit_text(f"⏳ Вы в очереди на загрузку расписания: {position}. Подождите...")
+            except Exception as e:
+                logging.debug(f"Не удалось обновить статус очереди: {e}")
 
-        file_path = await download_schedule(url, file_path)
+        digest = await shared_downloads.fetch(url, on_position=report_position)
+        if not await load_version_index(digest):
+            raise ValueError("в загруженном файле не найдено ни одного занятия")
 
-        df = pd.read_csv(file_path, sep=';')
-        print(df.head())
+        old_index = await load_schedule_index(user_id)
+        link_user_schedule(user_id, digest)
+        user_sources[user_id] = canonical_schedule_url(url)
+        invalidate_schedule(user_id, keep_renders=True)
+        new_index = await load_schedule_index(user_id)
+        summary = summarize_update(user_id, old_index, apply_schedule_update(user_id, old_index, new_index))
 
         await status_message.edit_text(
-            "✅ Расписание успешно обновлено!",
+            "✅ Расписание успешно обновлено!" + (f"\n\n{summary}" if summary else ""),
             reply_markup=get_main_keyboard(user_id)
         )
 
@@ -154,28 +162,37 @@ async def toggle_notifications(callback: types.CallbackQuery):
     current_state = user_notifications.get(user_id, False)
     user_notifications[user_id] = not current_state
     new_state = user_notifications[user_id]
+    await reminder_scheduler.refresh_user(user_id)
     keyboard = get_main_keyboard(user_id)
     status_text = "включены" if new_state else "выключены"
     await callback.message.edit_reply_markup(reply_markup=keyboard)
     await callback.answer(f"Напоминания {status_text} ✅")
 
 
+@dp.callback_query(F.data == "toggle_digest")
+async def toggle_digest(callback: types.CallbackQuery):
+    user_id = callback.from_user.id
+    choices = [None] + DIGEST_HOURS
+    current = user_digest_hours.get(user_id)
+    new_hour = choices[(choices.index(current) + 1) % len(choices)] if current in choices else choices[0]
+    if new_hour is None:
+        user_digest_hours.pop(user_id, None)
+    else:
+        user_digest_hours[user_id] = new_hour
+    await callback.message.edit_reply_markup(reply_markup=get_main_keyboard(user_id))
+    status_text = "выключена" if new_hour is None else f"в {new_hour:02d}:00"
+    await callback.answer(f"Утренняя сводка {status_text} ✅")
+
+
 @dp.callback_query(F.data.startswith('day_'))
 async def navigate_day(callback: types.CallbackQuery):
     user_id = callback.from_user.id
     date_str = callback.data.split('_', 1)[1]
     date = datetime.strptime(date_str, "%Y-%m-%d").date()
 
-    text = await get_schedule_data_for_day(date, user_id)
-
-    min_date = date.replace(day=1)
-    if date.month == 12:
-        max_date = date.replace(year=date.year + 1, month=1, day=1) - timedelta(days=1)
-    else:
-        max_date = date.replace(month=date.month + 1, day=1) - timedelta(days=1)
-
-    keyboard = get_day_navigation_keyboard(date, min_date, max_date)
-    await callback.message.edit_text(text, reply_markup=keyboard)
+    view = await load_day_view(user_id, date, *month_bounds(date))
+    keyboard = get_day_navigation_keyboard(view.prev_day, view.next_day)
+    await callback.message.edit_text(view.text, reply_markup=keyboard)
 
 
 @dp.callback_query(F.data == 'main_menu')
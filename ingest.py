@@ -0,0 +1,79 @@
+import codecs
+import hashlib
+import logging
+import os
+import uuid
+from typing import AsyncIterator
+
+from .binformat import write_compiled
+from .config import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE
+from .executor import run_blocking
+from .metrics import parse_seconds
+from .schedules import ScheduleFormatError, ScheduleIndex, ScheduleStreamParser, invalidate_schedule, load_schedule_index
+from .storage import get_user_schedule_file, link_user_schedule, store_blob
+
+
+class UploadRejected(ValueError):
+    pass
+
+
+async def _iter_chunks(bot, file_path: str) -> AsyncIterator[bytes]:
+    if bot.session.api.is_local:
+        with open(bot.session.api.wrap_local_file.to_local(file_path), "rb") as f:
+            for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+                yield chunk
+        return
+
+    url = bot.session.api.file_url(bot.token, file_path)
+    async for chunk in bot.session.stream_content(url=url, chunk_size=UPLOAD_CHUNK_SIZE, raise_for_status=True):
+        yield chunk
+
+
+def _compile_upload(tmp_path: str, version: str) -> int:
+    with open(tmp_path, encoding="utf-8", newline="\n") as f:
+        with parse_seconds.time(source="upload"):
+            parser = ScheduleStreamParser()
+            lessons = list(parser.feed(line.rstrip("\n") for line in f))
+            parser.finish()
+    write_compiled(version, ScheduleIndex.from_lessons(lessons, version).iter_lessons())
+    store_blob(tmp_path, version)
+    return parser.lessons
+
+
+async def ingest_schedule_upload(bot, file_path: str, user_id: int, file_size: int = 0) -> ScheduleIndex:
+    if file_size and file_size > MAX_UPLOAD_BYTES:
+        raise UploadRejected(f"файл слишком большой ({file_size // 1024} КБ, максимум {MAX_UPLOAD_BYTES // 1024} КБ)")
+
+    target_path = get_user_schedule_file(user_id)
+    tmp_path = f"{target_path}.{uuid.uuid4().hex}.upload"
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    digest = hashlib.sha256()
+    total = 0
+
+    try:
+        with open(tmp_path, "wb") as out:
+            async for chunk in _iter_chunks(bot, file_path):
+                total += len(chunk)
+                if total > MAX_UPLOAD_BYTES:
+                    raise UploadRejected(f"файл больше {MAX_UPLOAD_BYTES // 1024} КБ")
+                decoder.decode(chunk)
+                out.write(chunk)
+                digest.update(chunk)
+            decoder.decode(b"", final=True)
+            out.flush()
+            os.fsync(out.fileno())
+
+        version = digest.hexdigest()
+        lessons = await run_blocking(("upload", version), _compile_upload, tmp_path, version)
+        link_user_schedule(user_id, version)
+    except ScheduleFormatError as e:
+        raise UploadRejected(str(e))
+    except UnicodeDecodeError:
+        raise UploadRejected("файл должен быть в кодировке UTF-8")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logging.info(f"Пользователь {user_id} загрузил расписание: {lessons} занятий, {total} байт")
+    invalidate_schedule(user_id, keep_renders=True)
+    return await load_schedule_index(user_id)
@@ -1,12 +1,16 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from .storage import user_groups, user_notifications
-from datetime import timedelta
+from .storage import user_digest_hours, user_groups, user_notifications
+from datetime import date
+from typing import Optional
 
 
 def get_main_keyboard(user_id: int) -> InlineKeyboardMarkup:
     notif_state = user_notifications.get(user_id, False)
     notif_text = "🔔 Напоминания ВКЛ" if notif_state else "🔕 Напоминания ВЫКЛ"
 
+    digest_hour = user_digest_hours.get(user_id)
+    digest_text = "☀️ Утренняя сводка ВЫКЛ" if digest_hour is None else f"☀️ Утренняя сводка в {digest_hour:02d}:00"
+
     group_num = user_groups.get(user_id, 0)
     if group_num == 0:
         group_text = "👥 Фильтр: Все группы"
@@ -19,6 +23,7 @@ def get_main_keyboard(user_id: int) -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="📅 На этот месяц", callback_data="show_month"),
          InlineKeyboardButton(text="📅 На след месяц", callback_data="show_next_month")],
         [InlineKeyboardButton(text=notif_text, callback_data="toggle_notifications")],
+        [InlineKeyboardButton(text=digest_text, callback_data="toggle_digest")],
         [InlineKeyboardButton(text=group_text, callback_data="toggle_group")],
         [InlineKeyboardButton(text="🔄 Обновить расписание", callback_data="update_schedule")]
     ])
@@ -30,21 +35,19 @@ def get_back_keyboard() -> InlineKeyboardMarkup:
     ])
 
 
-def get_day_navigation_keyboard(current_date, min_date, max_date) -> InlineKeyboardMarkup:
+def get_day_navigation_keyboard(prev_date: Optional[date], next_date: Optional[date]) -> InlineKeyboardMarkup:
     nav_buttons = []
 
-    if current_date > min_date:
-        prev_day = current_date - timedelta(days=1)
+    if prev_date is not None:
         nav_buttons.append(InlineKeyboardButton(
             text="⬅️ Назад",
-            callback_data=f"day_{prev_day.isoformat()}"
+            callback_data=f"day_{prev_date.isoformat()}"
         ))
 
-    if current_date < max_date:
-        next_day = current_date + timedelta(days=1)
+    if next_date is not None:
         nav_buttons.append(InlineKeyboardButton(
             text="Вперед ➡️",
-            callback_data=f"day_{next_day.isoformat()}"
+            callback_data=f"day_{next_date.isoformat()}"
         ))
 
     keyboard = []
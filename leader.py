@@ -0,0 +1,53 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from .backends import StateBackend
+from .config import LEADER_LEASE_TTL, REPLICA_ID
+from .executor import run_blocking
+from .metrics import leader_status
+from .storage import state_backend
+
+
+class LeaderLease:
+    def __init__(self, name: str, backend: StateBackend = state_backend, owner: str = REPLICA_ID,
+                 ttl: float = LEADER_LEASE_TTL):
+        self.name = name
+        self.backend = backend
+        self.owner = owner
+        self.ttl = ttl
+        self.held = False
+
+    async def _renew(self) -> bool:
+        try:
+            return await run_blocking(None, self.backend.acquire_lease, self.name, self.owner, self.ttl)
+        except Exception as e:
+            logging.warning(f"Не удалось продлить lease {self.name}: {e}")
+            return False
+
+    async def run(self, factory: Callable[[], Awaitable[None]]) -> None:
+        task: Optional[asyncio.Task] = None
+        try:
+            while True:
+                self.held = await self._renew()
+                leader_status.set(1 if self.held else 0, lease=self.name)
+                if task is not None and task.done():
+                    if not task.cancelled() and task.exception():
+                        logging.error(f"Задача {self.name} завершилась с ошибкой: {task.exception()}")
+                    task = None
+                if self.held and task is None:
+                    logging.info(f"Реплика {self.owner} получила lease {self.name}")
+                    task = asyncio.create_task(factory())
+                elif not self.held and task is not None:
+                    logging.warning(f"Реплика {self.owner} потеряла lease {self.name}")
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    task = None
+                await asyncio.sleep(self.ttl / 3)
+        finally:
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            if self.held:
+                self.backend.release_lease(self.name, self.owner)
+                leader_status.set(0, lease=self.name)
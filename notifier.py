@@ -1,34 +1,234 @@
 import asyncio
+import heapq
+import itertools
 import logging
-from datetime import datetime, timedelta
-from .schedules import read_schedule
-from .storage import user_notifications
+import time as time_module
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from .config import NOTIFIER_RESYNC_INTERVAL, REMINDER_LEAD_MINUTES
+from .metrics import notifier_pending, notifier_tick_seconds, reminder_delay_seconds, reminders_sent
+from .ratelimit import latency_summary, sender
+from .schedules import Lesson, ScheduleDiff, ScheduleIndex, get_schedule_index, load_schedule_index
+from .storage import user_groups, user_notifications, user_schedule_versions
 
 
-async def send_notifications(bot):
-    while True:
-        try:
-            now = datetime.now()
-            time_plus_5 = (now + timedelta(minutes=5)).strftime("%H:%M")
+MAX_SLEEP_SECONDS = 3600
+
+
+class ReminderScheduler:
+    def __init__(self, lead: timedelta = timedelta(minutes=REMINDER_LEAD_MINUTES)):
+        self.lead = lead
+        self._heap: List[Tuple[datetime, int, int, int, Lesson]] = []
+        self._seq = itertools.count()
+        self._generations: Dict[int, int] = {}
+        self._live: Dict[int, int] = {}
+        self._sent: Set[Tuple[int, date, timedelta, str, str]] = set()
+        self._sent_day: Optional[date] = None
+        self._wakeup = asyncio.Event()
+        self._reports: Set[asyncio.Task] = set()
+        self._cancelled: Dict[int, Counter] = {}
+        self._synced: Dict[int, Tuple[bool, int, Optional[str]]] = {}
+        self.running = False
+
+    def _fire_time(self, lesson: Lesson, now: datetime) -> Optional[datetime]:
+        if lesson.start is None or lesson.date < now.date():
+            return None
+        starts_at = datetime.combine(lesson.date, time()) + lesson.start
+        if starts_at <= now:
+            return None
+        return starts_at - self.lead
+
+    def _push(self, user_id: int, generation: int, fire_at: datetime, lesson: Lesson) -> None:
+        heapq.heappush(self._heap, (fire_at, next(self._seq), user_id, generation, lesson))
+        self._live[user_id] += 1
+
+    @staticmethod
+    def _settings(user_id: int) -> Tuple[bool, int, Optional[str]]:
+        return (bool(user_notifications.get(user_id, False)), user_groups.get(user_id, 0),
+                user_schedule_versions.get(user_id))
+
+    def rebuild_user(self, user_id: int, now: Optional[datetime] = None,
+                     index: Optional[ScheduleIndex] = None) -> None:
+        generation = self._generations.get(user_id, 0) + 1
+        self._generations[user_id] = generation
+        self._live[user_id] = 0
+        self._cancelled.pop(user_id, None)
+        self._synced[user_id] = self._settings(user_id)
 
-            for user_id, enabled in list(user_notifications.items()):
-                if not enabled:
+        if user_notifications.get(user_id, False):
+            now = now or datetime.now()
+            if index is None:
+                index = get_schedule_index(user_id)
+            for day, lessons in index.for_group(user_groups.get(user_id, 0)).items():
+                if day < now.date():
                     continue
+                for lesson in lessons:
+                    fire_at = self._fire_time(lesson, now)
+                    if fire_at is not None:
+                        self._push(user_id, generation, fire_at, lesson)
+
+        if len(self._heap) > 2 * sum(self._live.values()) + 1024:
+            self._compact()
+        self._wakeup.set()
+
+    def update_user(self, user_id: int, changes: ScheduleDiff, index: ScheduleIndex,
+                    now: Optional[datetime] = None) -> None:
+        if not self.running:
+            return
+        if user_id not in self._generations:
+            self.rebuild_user(user_id, now, index)
+            return
+        if not user_notifications.get(user_id, False):
+            return
+
+        now = now or datetime.now()
+        changes = changes.for_group(user_groups.get(user_id, 0))
+        generation = self._generations[user_id]
+        cancelled = self._cancelled.setdefault(user_id, Counter())
+        for lesson in changes.removed + [old for old, _ in changes.changed]:
+            if self._fire_time(lesson, now) is not None:
+                cancelled[lesson] += 1
+        for lesson in changes.added + [new for _, new in changes.changed]:
+            if cancelled.get(lesson):
+                cancelled[lesson] -= 1
+                continue
+            fire_at = self._fire_time(lesson, now)
+            if fire_at is not None:
+                self._push(user_id, generation, fire_at, lesson)
+        self._synced[user_id] = self._settings(user_id)
+        self._wakeup.set()
+
+    async def refresh_user(self, user_id: int) -> None:
+        if not self.running:
+            return
+        index = await load_schedule_index(user_id) if user_notifications.get(user_id, False) else None
+        self.rebuild_user(user_id, index=index)
+
+    async def rebuild_all(self) -> None:
+        user_ids = {user_id for user_id, enabled in list(user_notifications.items()) if enabled}
+        user_ids.update(user_id for user_id, live in self._live.items() if live)
+        for user_id in user_ids:
+            try:
+                await self.refresh_user(user_id)
+            except Exception as e:
+                logging.exception(f"Не удалось построить напоминания для пользователя {user_id}: {e}")
+
+    async def resync(self) -> None:
+        user_ids = {user_id for user_id, enabled in list(user_notifications.items()) if enabled}
+        user_ids.update(self._synced)
+        stale = [user_id for user_id in user_ids if self._synced.get(user_id) != self._settings(user_id)]
+        for user_id in stale:
+            try:
+                await self.refresh_user(user_id)
+            except Exception as e:
+                logging.exception(f"Не удалось обновить напоминания для пользователя {user_id}: {e}")
+        if stale:
+            logging.info(f"Напоминания пересобраны для {len(stale)} из {len(user_ids)} пользователей")
+
+    def _compact(self) -> None:
+        self._heap = [entry for entry in self._heap if self._generations.get(entry[2]) == entry[3]]
+        heapq.heapify(self._heap)
+
+    def _pop_due(self, now: datetime) -> List[Tuple[datetime, int, Lesson]]:
+        if self._sent_day != now.date():
+            self._sent = {key for key in self._sent if key[1] >= now.date()}
+            self._sent_day = now.date()
+
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, _, user_id, generation, lesson = heapq.heappop(self._heap)
+            if self._generations.get(user_id) != generation:
+                continue
+            self._live[user_id] -= 1
+            cancelled = self._cancelled.get(user_id)
+            if cancelled and cancelled.get(lesson):
+                cancelled[lesson] -= 1
+                continue
+            if datetime.combine(lesson.date, time()) + lesson.start <= now:
+                continue
+            key = (user_id, lesson.date, lesson.start, lesson.zajecia, lesson.grupy)
+            if key in self._sent:
+                continue
+            self._sent.add(key)
+            due.append((fire_at, user_id, lesson))
+        return due
+
+    def _seconds_until_next(self, now: datetime) -> float:
+        if not self._heap:
+            return MAX_SLEEP_SECONDS
+        return min(max((self._heap[0][0] - now).total_seconds(), 0), MAX_SLEEP_SECONDS)
+
+    def format_reminder(self, lessons: List[Lesson]) -> str:
+        minutes = round(self.lead.total_seconds() / 60)
+        if len(lessons) == 1:
+            return f"⏰ Через {minutes} минут: {lessons[0].zajecia} | {lessons[0].sala}"
+        lines = [f"⏰ Через {minutes} минут:"]
+        lines.extend(f"• {lesson.zajecia} | {lesson.sala}" for lesson in lessons)
+        return "\n".join(lines)
+
+    async def _dispatch(self, due: List[Tuple[datetime, int, Lesson]]) -> None:
+        batches: Dict[int, Tuple[datetime, List[Lesson]]] = {}
+        for fire_at, user_id, lesson in due:
+            first_fire, lessons = batches.setdefault(user_id, (fire_at, []))
+            batches[user_id] = (min(first_fire, fire_at), lessons)
+            lessons.append(lesson)
+
+        futures = []
+        for user_id, (fire_at, lessons) in batches.items():
+            futures.append(await sender.send(user_id, self.format_reminder(lessons), due=fire_at.timestamp()))
+        report = asyncio.create_task(self._report_tick(futures))
+        self._reports.add(report)
+        report.add_done_callback(self._reports.discard)
+
+    async def _report_tick(self, futures: List[asyncio.Future]) -> None:
+        started = time_module.monotonic()
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for result in results:
+            if isinstance(result, float):
+                reminder_delay_seconds.observe(result)
+                reminders_sent.inc(outcome="delivered")
+            else:
+                reminders_sent.inc(outcome="failed")
+        delivered, failed, summary = latency_summary(results)
+        logging.info(f"Напоминания: доставлено {delivered}, ошибок {failed}, задержка {summary}, "
+                     f"рассылка {time_module.monotonic() - started:.2f}s")
+
+    async def run(self, bot) -> None:
+        sender.start(bot)
+        self.running = True
+        try:
+            await self.rebuild_all()
+            next_resync = time_module.monotonic() + NOTIFIER_RESYNC_INTERVAL
+            while True:
                 try:
-                    df = read_schedule(user_id)
-                    if df.empty or 'Czas od' not in df.columns:
-                        continue
-
-                    df['Czas od'] = df['Czas od'].astype(str).str.strip()
-
-                    upcoming = df[(df['Data_dt'] == now.date()) & (df['Czas od'] == time_plus_5)]
-                    for _, row in upcoming.iterrows():
-                        text = f"⏰ Через 5 минут: {row.get('Zajecia', '(предмет)')} | {row.get('Sala', '(зала)')}"
-                        await bot.send_message(user_id, text)
-                except Exception as e_user:
-                    logging.exception(f"Ошибка при отправке уведомления пользователю {user_id}: {e_user}")
-
-            await asyncio.sleep(60)
-        except Exception as e:
-            logging.exception(f"Ошибка в send_notifications loop: {e}")
-            await asyncio.sleep(5)
+                    if NOTIFIER_RESYNC_INTERVAL and time_module.monotonic() >= next_resync:
+                        await self.resync()
+                        next_resync = time_module.monotonic() + NOTIFIER_RESYNC_INTERVAL
+
+                    with notifier_tick_seconds.time():
+                        due = self._pop_due(datetime.now())
+                        if due:
+                            await self._dispatch(due)
+
+                    timeout = self._seconds_until_next(datetime.now())
+                    if NOTIFIER_RESYNC_INTERVAL:
+                        timeout = min(timeout, max(next_resync - time_module.monotonic(), 0))
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                except Exception as e:
+                    logging.exception(f"Ошибка в send_notifications loop: {e}")
+                    await asyncio.sleep(5)
+        finally:
+            self.running = False
+
+
+reminder_scheduler = ReminderScheduler()
+notifier_pending.collect_from(lambda: {(): sum(reminder_scheduler._live.values())})
+
+
+async def send_notifications(bot):
+    await reminder_scheduler.run(bot)
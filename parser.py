@@ -1,64 +1,249 @@
 import asyncio
-from playwright.async_api import async_playwright
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import urldefrag
+import aiohttp
 import logging
 
+from .config import BROWSER_CONTEXT_MAX_USES, BROWSER_MAX_CONTEXTS, DOWNLOAD_TIMEOUT, HTTP_DOWNLOAD_TIMEOUT
+from .metrics import download_seconds
+
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, BrowserContext, Page, Playwright
+
 
 URL = "https://harmonogramy.dsw.edu.pl/Plany/PlanyTokow/1178"
 
+PositionCallback = Callable[[int], Awaitable[None]]
 
-async def download_schedule(url: str, save_path: str) -> str:
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
 
-        await page.goto(url, timeout=60000)
+class BrowserPool:
+    def __init__(self, max_contexts: int = BROWSER_MAX_CONTEXTS, max_uses: int = BROWSER_CONTEXT_MAX_USES):
+        self.max_contexts = max_contexts
+        self.max_uses = max_uses
+        self._playwright: Optional["Playwright"] = None
+        self._browser: Optional["Browser"] = None
+        self._start_lock = asyncio.Lock()
+        self._idle: List[Tuple["BrowserContext", int]] = []
+        self._active = 0
+        self._waiters: Deque[Tuple[asyncio.Future, Optional[PositionCallback]]] = deque()
+        self._reported: Dict[asyncio.Future, int] = {}
+        self._callbacks: Set[asyncio.Task] = set()
 
-        try:
-            await page.click("button:has-text('Zezwól')", timeout=5000)
-        except Exception:
-            pass
+    async def _ensure_browser(self) -> "Browser":
+        async with self._start_lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    from playwright.async_api import async_playwright
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True)
+                self._idle.clear()
+                logging.info("Chromium запущен для пула загрузок")
+            return self._browser
 
-        try:
-            labels = await page.query_selector_all("label.custom-control-label")
-            for lbl in labels:
-                text = (await lbl.inner_text()).strip()
-                if text == "Cały semestr":
-                    await lbl.click()
-                    break
-        except Exception as e:
-            logging.debug("Ошибка при выборе 'Cały semestr': %s", e)
+    def _notify_positions(self) -> None:
+        for position, (future, on_position) in enumerate(self._waiters, start=1):
+            if on_position is not None and self._reported.get(future) != position:
+                self._reported[future] = position
+                task = asyncio.create_task(on_position(position))
+                self._callbacks.add(task)
+                task.add_done_callback(self._callbacks.discard)
+
+    async def _acquire_slot(self, on_position: Optional[PositionCallback]) -> None:
+        if self._active < self.max_contexts and not self._waiters:
+            self._active += 1
+            return
 
+        waiter = (asyncio.get_running_loop().create_future(), on_position)
+        self._waiters.append(waiter)
+        self._notify_positions()
         try:
-            await page.wait_for_selector("a#SzukajLogout", timeout=60000)
-            await page.click("a#SzukajLogout")
-        except Exception as e:
-            logging.exception("Ошибка при клике SzukajLogout: %s", e)
-            await page.screenshot(path="debug_szukaj.png")
-            await browser.close()
+            await waiter[0]
+        except asyncio.CancelledError:
+            if waiter[0].done() and not waiter[0].cancelled():
+                self._release_slot()
+            else:
+                self._waiters.remove(waiter)
+                self._reported.pop(waiter[0], None)
+                self._notify_positions()
             raise
 
-        await asyncio.sleep(5)
+    def _release_slot(self) -> None:
+        while self._waiters:
+            future, _ = self._waiters.popleft()
+            self._reported.pop(future, None)
+            if not future.done():
+                future.set_result(None)
+                self._notify_positions()
+                return
+        self._active -= 1
+
+    @property
+    def queue_length(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def page(self, on_position: Optional[PositionCallback] = None):
+        await self._acquire_slot(on_position)
+        context: Optional["BrowserContext"] = None
+        uses = 0
+        healthy = False
+        try:
+            browser = await self._ensure_browser()
+            if self._idle:
+                context, uses = self._idle.pop()
+            else:
+                context = await browser.new_context(accept_downloads=True)
+            page: "Page" = await context.new_page()
+            try:
+                yield page
+                healthy = True
+            finally:
+                await page.close()
+        finally:
+            if context is not None:
+                uses += 1
+                if healthy and uses < self.max_uses and self._browser is not None and self._browser.is_connected():
+                    self._idle.append((context, uses))
+                else:
+                    try:
+                        await context.close()
+                    except Exception as e:
+                        logging.debug("Ошибка при закрытии контекста браузера: %s", e)
+            self._release_slot()
+
+    async def close(self) -> None:
+        for context, _ in self._idle:
+            try:
+                await context.close()
+            except Exception:
+                pass
+        self._idle.clear()
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+browser_pool = BrowserPool()
+
+_export_urls: Dict[str, Tuple[str, Dict[str, str]]] = {}
+_http_session: Optional[aiohttp.ClientSession] = None
+
+
+def canonical_schedule_url(url: str) -> str:
+    return urldefrag(url.strip())[0].rstrip("/")
+
+
+def _get_http_session() -> aiohttp.ClientSession:
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=HTTP_DOWNLOAD_TIMEOUT),
+            connector=aiohttp.TCPConnector(limit=16, keepalive_timeout=60),
+        )
+    return _http_session
+
+
+def _looks_like_schedule_csv(body: bytes) -> bool:
+    return b"Czas od" in body[:4096]
+
+
+async def _download_over_http(export_url: str, cookies: Dict[str, str], save_path: str) -> str:
+    async with _get_http_session().get(export_url, cookies=cookies) as response:
+        response.raise_for_status()
+        body = await response.read()
+    if not _looks_like_schedule_csv(body):
+        raise ValueError(f"Ответ {export_url} не похож на CSV расписания")
 
+    tmp_path = f"{save_path}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(body)
+    os.replace(tmp_path, save_path)
+    return save_path
+
+
+async def _download_with_page(page: "Page", url: str, save_path: str) -> str:
+    await page.goto(url, timeout=60000)
+
+    try:
+        await page.click("button:has-text('Zezwól')", timeout=5000)
+    except Exception:
+        pass
+
+    try:
+        labels = await page.query_selector_all("label.custom-control-label")
+        for lbl in labels:
+            text = (await lbl.inner_text()).strip()
+            if text == "Cały semestr":
+                await lbl.click()
+                break
+    except Exception as e:
+        logging.debug("Ошибка при выборе 'Cały semestr': %s", e)
+
+    try:
+        await page.wait_for_selector("a#SzukajLogout", timeout=60000)
+        await page.click("a#SzukajLogout")
+    except Exception as e:
+        logging.exception("Ошибка при клике SzukajLogout: %s", e)
+        await page.screenshot(path="debug_szukaj.png")
+        raise
+
+    try:
+        await page.wait_for_load_state("networkidle", timeout=30000)
+    except Exception as e:
+        logging.debug("Страница не успокоилась после Szukaj: %s", e)
+
+    try:
+        link = await page.wait_for_selector("a[href*='WydrukTokuCsv']:visible", timeout=60000)
+        export_url = await link.evaluate("el => el.href")
+        cookies = {c["name"]: c["value"] for c in await page.context.cookies(export_url)}
+        _export_urls[canonical_schedule_url(url)] = (export_url, cookies)
+
+        async with page.expect_download(timeout=120000) as download_info:
+            try:
+                await link.click()
+            except Exception:
+                await link.evaluate("el => el.click()")
+        download = await download_info.value
+        await download.save_as(save_path)
+    except Exception as e:
+        logging.exception("Ошибка при скачивании CSV: %s", e)
+        await page.screenshot(path="debug_download.png")
+        raise
+
+    return save_path
+
+
+async def download_schedule(url: str, save_path: str, on_position: Optional[PositionCallback] = None) -> str:
+    key = canonical_schedule_url(url)
+    cached = _export_urls.get(key)
+    if cached is not None:
         try:
-            link = await page.wait_for_selector("a[href*='WydrukTokuCsv']:visible", timeout=60000)
-            async with page.expect_download(timeout=120000) as download_info:
-                try:
-                    await link.click()
-                except Exception:
-                    await link.evaluate("el => el.click()")
-            download = await download_info.value
-            await download.save_as(save_path)
+            with download_seconds.time(path="http"):
+                return await _download_over_http(cached[0], cached[1], save_path)
         except Exception as e:
-            logging.exception("Ошибка при скачивании CSV: %s", e)
-            await page.screenshot(path="debug_download.png")
-            await browser.close()
-            raise
+            logging.warning("Прямая загрузка CSV для %s не удалась, используем браузер: %s", key, e)
+            _export_urls.pop(key, None)
 
-        await browser.close()
-        return save_path
+    with download_seconds.time(path="browser"):
+        async with browser_pool.page(on_position) as page:
+            return await asyncio.wait_for(_download_with_page(page, url, save_path), DOWNLOAD_TIMEOUT)
+
+
+async def close_downloads() -> None:
+    await browser_pool.close()
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
 
 
 async def main():
+    from playwright.async_api import async_playwright
+
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=False)  
         page = await browser.new_page()
@@ -82,7 +267,7 @@ async def main():
         await page.click("a#SzukajLogout")
         print("Нажата кнопка Szukaj")
 
-        await asyncio.sleep(40)
+        await page.wait_for_selector("a[href*='WydrukTokuCsv']:visible", timeout=120000)
 
         async with page.expect_download() as download_info:
             await page.locator("a[href*='WydrukTokuCsv']").click(no_wait_after=True)
@@ -94,4 +279,5 @@ async def main():
         await browser.close()
 
 
-asyncio.run(main())
+if __name__ == "__main__":
+    asyncio.run(main())
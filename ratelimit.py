@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from .config import SEND_MAX_RETRIES, SEND_QUEUE_SIZE, SEND_RATE_GLOBAL, SEND_RATE_PER_CHAT, SEND_WORKERS
+from .metrics import send_queue_size
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RateLimitedSender:
+    def __init__(self, workers: int = SEND_WORKERS, queue_size: int = SEND_QUEUE_SIZE,
+                 global_rate: float = SEND_RATE_GLOBAL, per_chat_rate: float = SEND_RATE_PER_CHAT,
+                 max_retries: int = SEND_MAX_RETRIES):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._per_chat: Dict[int, TokenBucket] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._bot = None
+
+    def start(self, bot) -> None:
+        if self._tasks:
+            return
+        self._bot = bot
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 0) -> None:
+        if drain_timeout and self._queue is not None and self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"Не отправлено {self._queue.qsize()} сообщений при остановке")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def send(self, chat_id: int, text: str, due: Optional[float] = None, **kwargs) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((chat_id, text, kwargs, time.time() if due is None else due, future))
+        return future
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._per_chat.get(chat_id)
+        if bucket is None:
+            if len(self._per_chat) > 10000:
+                idle_since = time.monotonic() - 60
+                self._per_chat = {k: b for k, b in self._per_chat.items() if b.updated > idle_since}
+            bucket = self._per_chat[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        return bucket
+
+    async def _deliver(self, chat_id: int, text: str, kwargs: dict) -> None:
+        for attempt in range(self.max_retries + 1):
+            await self._chat_bucket(chat_id).acquire()
+            await self._global.acquire()
+            try:
+                await self._bot.send_message(chat_id, text, **kwargs)
+                return
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(f"Flood control для {chat_id}, повтор через {e.retry_after} с")
+                await asyncio.sleep(e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+    async def _worker(self) -> None:
+        while True:
+            chat_id, text, kwargs, due, future = await self._queue.get()
+            try:
+                await self._deliver(chat_id, text, kwargs)
+                if not future.done():
+                    future.set_result(max(time.time() - due, 0.0))
+            except TelegramForbiddenError as e:
+                logging.info(f"Пользователь {chat_id} заблокировал бота: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            except Exception as e:
+                logging.exception(f"Не удалось отправить сообщение пользователю {chat_id}: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+
+def latency_summary(results: List[object]) -> Tuple[int, int, str]:
+    latencies = [r for r in results if isinstance(r, float)]
+    failed = len(results) - len(latencies)
+    text = (f"p50={percentile(latencies, 0.5):.2f}s p95={percentile(latencies, 0.95):.2f}s "
+            f"max={max(latencies, default=0.0):.2f}s")
+    return len(latencies), failed, text
+
+
+sender = RateLimitedSender()
+send_queue_size.collect_from(lambda: {(): sender._queue.qsize() if sender._queue is not None else 0})
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+import random
+from typing import Dict, List
+
+from .config import REFRESH_CONCURRENCY, REFRESH_INTERVAL, REFRESH_JITTER, REFRESH_NOTIFY_CHANGES
+from .downloads import shared_downloads
+from .executor import run_blocking
+from .metrics import change_notices_sent
+from .ratelimit import sender
+from .schedules import format_changes, invalidate_schedule, load_schedule_index, load_version_index
+from .storage import (collect_unused_blobs, file_digest, get_blob_path, get_user_schedule_file, link_user_schedule,
+                      user_groups, user_schedule_versions, user_sources)
+from .updates import apply_schedule_update
+
+
+def _has_version(user_id: int, digest: str) -> bool:
+    file_path = get_user_schedule_file(user_id)
+    if not os.path.exists(file_path):
+        return False
+    try:
+        if os.path.samefile(file_path, get_blob_path(digest)):
+            return True
+    except OSError:
+        pass
+    return file_digest(file_path) == digest
+
+
+async def _apply_version(user_id: int, digest: str) -> None:
+    if _has_version(user_id, digest):
+        return
+
+    old_index = await load_schedule_index(user_id)
+    link_user_schedule(user_id, digest)
+    invalidate_schedule(user_id, keep_renders=True)
+    new_index = await load_schedule_index(user_id)
+    changes = apply_schedule_update(user_id, old_index, new_index)
+    if not changes:
+        return
+
+    visible = changes.for_group(user_groups.get(user_id, 0))
+    if REFRESH_NOTIFY_CHANGES and visible:
+        future = await sender.send(user_id, format_changes(visible))
+        future.add_done_callback(_count_notice)
+
+
+def _count_notice(future: asyncio.Future) -> None:
+    if future.cancelled():
+        return
+    change_notices_sent.inc(outcome="failed" if future.exception() is not None else "delivered")
+
+
+async def refresh_url(url: str, user_ids: List[int], semaphore: asyncio.Semaphore) -> None:
+    try:
+        async with semaphore:
+            digest = await shared_downloads.fetch(url, force=True)
+        if not await load_version_index(digest):
+            raise ValueError("в загруженном файле не найдено ни одного занятия")
+    except Exception as e:
+        logging.warning(f"Не удалось обновить расписание {url}: {e}")
+        return
+
+    for user_id in user_ids:
+        if user_sources.get(user_id) != url:
+            continue
+        try:
+            await _apply_version(user_id, digest)
+        except Exception as e:
+            logging.exception(f"Не удалось применить обновление расписания для пользователя {user_id}: {e}")
+
+
+async def refresh_once() -> None:
+    by_url: Dict[str, List[int]] = {}
+    for user_id, url in list(user_sources.items()):
+        by_url.setdefault(url, []).append(user_id)
+    if by_url:
+        semaphore = asyncio.Semaphore(REFRESH_CONCURRENCY)
+        await asyncio.gather(*(refresh_url(url, user_ids, semaphore) for url, user_ids in by_url.items()))
+        logging.info(f"Фоновое обновление расписаний завершено: {len(by_url)} источников")
+
+    removed = await run_blocking(None, collect_unused_blobs, set(user_schedule_versions.values()))
+    if removed:
+        logging.info(f"Удалено {removed} неиспользуемых версий расписаний")
+
+
+async def refresh_schedules(bot) -> None:
+    sender.start(bot)
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL * random.uniform(1 - REFRESH_JITTER, 1 + REFRESH_JITTER))
+        try:
+            await refresh_once()
+        except Exception as e:
+            logging.exception(f"Ошибка в фоновом обновлении расписаний: {e}")
@@ -1,8 +1,370 @@
+import asyncio
+import csv
 import logging
 import os
-from datetime import datetime, date
-import pandas as pd
-from .storage import get_user_schedule_file, user_groups
+import re
+import threading
+import time
+import weakref
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+from .binformat import read_compiled, write_compiled
+from .config import RENDER_CACHE_SIZE, SCHEDULE_CACHE_SIZE
+from .executor import run_blocking
+from .metrics import cache_events, parse_seconds, render_seconds, timed
+from .storage import file_digest, get_blob_path, get_user_schedule_file, sync_user_schedule, user_groups
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+_GROUP_NUMBER_RE = re.compile(r"Cw(\d+)S")
+_TIME_RE = re.compile(r"^(\d{1,2}):(\d{2})$")
+
+
+class Lesson(NamedTuple):
+    date: date
+    start: Optional[timedelta]
+    end: Optional[timedelta]
+    czas_od: str
+    czas_do: str
+    grupy: str
+    zajecia: str
+    sala: str
+    uwagi: str
+
+
+def belongs_to_group(grupa_val: str, group_num: int) -> bool:
+    if not isinstance(grupa_val, str):
+        return False
+    grupa_val = grupa_val.strip()
+    if "WykS" in grupa_val:
+        return True
+    return f"Cw{group_num}S" in grupa_val
+
+
+class ScheduleIndex:
+    __slots__ = ("by_date", "dates", "version", "_by_group", "_days_by_group")
+
+    def __init__(self, by_date: Dict[date, Tuple[Lesson, ...]], version: Optional[str] = None):
+        self.by_date = by_date
+        self.version = version
+        self.dates: Tuple[date, ...] = tuple(sorted(by_date))
+        self._by_group: Dict[int, Dict[date, Tuple[Lesson, ...]]] = {0: by_date}
+        self._days_by_group: Dict[int, Tuple[date, ...]] = {0: self.dates}
+
+    def __len__(self) -> int:
+        return len(self.by_date)
+
+    def for_group(self, group_num: int) -> Dict[date, Tuple[Lesson, ...]]:
+        view = self._by_group.get(group_num)
+        if view is None:
+            view = {}
+            for day, lessons in self.by_date.items():
+                kept = tuple(lesson for lesson in lessons if belongs_to_group(lesson.grupy, group_num))
+                if kept:
+                    view[day] = kept
+            self._by_group[group_num] = view
+        return view
+
+    def days_for_group(self, group_num: int) -> Tuple[date, ...]:
+        days = self._days_by_group.get(group_num)
+        if days is None:
+            days = self._days_by_group[group_num] = tuple(sorted(self.for_group(group_num)))
+        return days
+
+    def lessons_for(self, day: date, group_num: int = 0) -> Tuple[Lesson, ...]:
+        return self.for_group(group_num).get(day, ())
+
+    def adopt_unchanged(self, previous: "ScheduleIndex", changed_dates: Set[date]) -> None:
+        for day, lessons in previous.by_date.items():
+            if day not in changed_dates and day in self.by_date:
+                self.by_date[day] = lessons
+        for group_num, view in list(previous._by_group.items()):
+            if group_num in self._by_group:
+                continue
+            adopted = {day: lessons for day, lessons in view.items() if day not in changed_dates}
+            for day in changed_dates:
+                kept = tuple(lesson for lesson in self.by_date.get(day, ()) if belongs_to_group(lesson.grupy, group_num))
+                if kept:
+                    adopted[day] = kept
+            self._by_group[group_num] = adopted
+
+    def iter_lessons(self) -> Iterable[Lesson]:
+        for day in self.dates:
+            yield from self.by_date[day]
+
+    @classmethod
+    def from_lessons(cls, lessons: Iterable[Lesson], version: Optional[str] = None) -> "ScheduleIndex":
+        grouped: Dict[date, list] = {}
+        for lesson in lessons:
+            grouped.setdefault(lesson.date, []).append(lesson)
+
+        by_date = {}
+        for day, day_lessons in grouped.items():
+            day_lessons.sort(key=lambda lesson: (lesson.start is None, lesson.start or timedelta(0)))
+            by_date[day] = tuple(day_lessons)
+        return cls(by_date, version)
+
+    @classmethod
+    def from_frame(cls, df: "pd.DataFrame", version: Optional[str] = None) -> "ScheduleIndex":
+        import pandas as pd
+
+        if df.empty:
+            return cls({}, version)
+
+        def column(name: str) -> list:
+            if name in df.columns:
+                return df[name].tolist()
+            return [None] * len(df)
+
+        def text(value) -> str:
+            return "" if value is None else str(value)
+
+        def timedelta_or_none(value) -> Optional[timedelta]:
+            return None if pd.isna(value) else pd.Timedelta(value).to_pytimedelta()
+
+        def lessons() -> Iterable[Lesson]:
+            for day, start, end, czas_od, czas_do, grupy, zajecia, sala, uwagi in zip(
+                    column("Data_dt"), column("Czas_od_td"), column("Czas_do_td"), column("Czas od"),
+                    column("Czas do"), column("Grupy"), column("Zajecia"), column("Sala"), column("Uwagi")):
+                uwagi = text(uwagi).strip()
+                if uwagi.lower() == 'nan':
+                    uwagi = ""
+                yield Lesson(
+                    date=day,
+                    start=timedelta_or_none(start),
+                    end=timedelta_or_none(end),
+                    czas_od=text(czas_od),
+                    czas_do=text(czas_do),
+                    grupy=grupy if isinstance(grupy, str) else "",
+                    zajecia=text(zajecia),
+                    sala=text(sala),
+                    uwagi=uwagi,
+                )
+
+        return cls.from_lessons(lessons(), version)
+
+
+class ScheduleFormatError(ValueError):
+    pass
+
+
+class ScheduleStreamParser:
+    def __init__(self):
+        self.line_no = 0
+        self.current_date: Optional[date] = None
+        self.headers = 0
+        self.lessons = 0
+
+    @staticmethod
+    def _time(value: str) -> Optional[timedelta]:
+        match = _TIME_RE.match(value)
+        if match is None:
+            return None
+        return timedelta(hours=int(match.group(1)), minutes=int(match.group(2)))
+
+    def feed(self, lines: Iterable[str]) -> Iterable[Lesson]:
+        rows = csv.reader((line.rstrip("\r") for line in lines), delimiter=';', skipinitialspace=True)
+        for row in rows:
+            self.line_no += 1
+            if self.line_no <= 2 or not any(field.strip() for field in row):
+                continue
+
+            first_col = row[0].strip()
+            if first_col.startswith("Data Zajec"):
+                self.headers += 1
+                parts = first_col.split()
+                try:
+                    self.current_date = datetime.strptime(parts[2], "%Y.%m.%d").date()
+                except (IndexError, ValueError):
+                    logging.warning(f"Не удалось распарсить дату '{first_col}' в строке {self.line_no}")
+                    self.current_date = None
+                continue
+
+            if self.current_date is None:
+                continue
+
+            row += [""] * (9 - len(row))
+            czas_od = row[1].strip() or "nan"
+            czas_do = row[2] or "nan"
+            self.lessons += 1
+            yield Lesson(
+                date=self.current_date,
+                start=self._time(czas_od),
+                end=self._time(czas_do.strip()),
+                czas_od=czas_od,
+                czas_do=czas_do,
+                grupy=row[4],
+                zajecia=row[5] or "nan",
+                sala=row[6] or "nan",
+                uwagi=row[8].strip(),
+            )
+
+    def finish(self) -> None:
+        if self.headers == 0:
+            raise ScheduleFormatError("в файле нет строк 'Data Zajec' — это не похоже на Plany.csv")
+        if self.lessons == 0:
+            raise ScheduleFormatError("в файле не найдено ни одного занятия")
+
+
+class DayView(NamedTuple):
+    day: date
+    text: str
+    prev_day: Optional[date]
+    next_day: Optional[date]
+
+
+def _match_key(lesson: Lesson) -> Tuple[date, Optional[timedelta], str, str]:
+    return lesson.date, lesson.start, lesson.grupy.strip(), lesson.zajecia.strip()
+
+
+class ScheduleDiff(NamedTuple):
+    added: List[Lesson]
+    removed: List[Lesson]
+    changed: List[Tuple[Lesson, Lesson]]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    @property
+    def dates(self) -> Set[date]:
+        return ({lesson.date for lesson in self.added} | {lesson.date for lesson in self.removed}
+                | {new.date for _, new in self.changed})
+
+    def for_group(self, group_num: int) -> "ScheduleDiff":
+        if group_num <= 0:
+            return self
+        return ScheduleDiff(
+            added=[lesson for lesson in self.added if belongs_to_group(lesson.grupy, group_num)],
+            removed=[lesson for lesson in self.removed if belongs_to_group(lesson.grupy, group_num)],
+            changed=[(old, new) for old, new in self.changed if belongs_to_group(new.grupy, group_num)],
+        )
+
+
+def diff_schedules(old: ScheduleIndex, new: ScheduleIndex) -> ScheduleDiff:
+    added: List[Lesson] = []
+    removed: List[Lesson] = []
+    changed: List[Tuple[Lesson, Lesson]]
+    for day in sorted(set(old.by_date) | set(new.by_date)):
+        old_lessons = old.by_date.get(day, ())
+        new_lessons = new.by_date.get(day, ())
+        if old_lessons == new_lessons:
+            continue
+        old_counts = Counter(old_lessons)
+        new_counts = Counter(new_lessons)
+        unmatched: Dict[Tuple[date, Optional[timedelta], str, str], List[Lesson]] = {}
+        for lesson in (old_counts - new_counts).elements():
+            unmatched.setdefault(_match_key(lesson), []).append(lesson)
+        for lesson in (new_counts - old_counts).elements():
+            candidates = unmatched.get(_match_key(lesson))
+            if candidates:
+                changed.append((candidates.pop(0), lesson))
+            else:
+                added.append(lesson)
+        removed.extend(lesson for lessons in unmatched.values() for lesson in lessons)
+    return ScheduleDiff(added, removed, changed)
+
+
+def _describe_change(old: Lesson, new: Lesson) -> str:
+    parts = []
+    if (old.czas_od, old.czas_do) != (new.czas_od, new.czas_do):
+        parts.append(f"время {old.czas_od}-{old.czas_do} → {new.czas_od}-{new.czas_do}")
+    if old.sala.strip() != new.sala.strip():
+        parts.append(f"аудитория {old.sala.strip() or '—'} → {new.sala.strip() or '—'}")
+    if old.uwagi != new.uwagi:
+        parts.append(f"примечание: {new.uwagi or '—'}")
+    return ", ".join(parts)
+
+
+def format_changes(diff: ScheduleDiff, limit: int = 20) -> str:
+    lines = ["🔄 В расписании изменения:\n"]
+    entries = [("➕", lesson, "") for lesson in diff.added] + [("➖", lesson, "") for lesson in diff.removed]
+    entries += [("✏️", new, _describe_change(old, new)) for old, new in diff.changed]
+    entries.sort(key=lambda entry: (entry[1].date, entry[1].start or timedelta(0)))
+    for sign, lesson, details in entries[:limit]:
+        line = f"{sign} {lesson.date:%d.%m} {lesson.czas_od}-{lesson.czas_do} {lesson.zajecia.strip()} | {lesson.sala.strip()}"
+        lines.append(f"{line} ({details})" if details else line)
+    if len(entries) > limit:
+        lines.append(f"… и ещё {len(entries) - limit}")
+    return "\n".join(lines)
+
+
+class _ParsedSchedule:
+    __slots__ = ("version", "source_path", "user_id", "_frame", "_index", "__weakref__")
+
+    def __init__(self, version: str, source_path: str, user_id: int,
+                 frame: Optional["pd.DataFrame"] = None, index: Optional[ScheduleIndex] = None):
+        self.version = version
+        self.source_path = source_path
+        self.user_id = user_id
+        self._frame = frame
+        self._index = index
+
+    def frame_for(self, *paths: str) -> "pd.DataFrame":
+        if self._frame is None:
+            for path in (get_blob_path(self.version),) + paths + (self.source_path,):
+                if os.path.exists(path) and file_digest(path) == self.version:
+                    self._frame = _parse_schedule_file(path, self.user_id)
+                    break
+            else:
+                raise FileNotFoundError(f"Исходный файл расписания версии {self.version[:12]} больше недоступен")
+        return self._frame
+
+    @property
+    def frame(self) -> "pd.DataFrame":
+        return self.frame_for()
+
+    @property
+    def index(self) -> ScheduleIndex:
+        if self._index is None:
+            self._index = ScheduleIndex.from_frame(self.frame, self.version)
+        return self._index
+
+
+def _parse_versioned(version: str, SCHEDULE_FILE: str, user_id: int) -> _ParsedSchedule:
+    started = time.perf_counter()
+    fields = read_compiled(version)
+    if fields is not None:
+        index = ScheduleIndex.from_lessons(map(Lesson._make, fields), version)
+        parse_seconds.observe(time.perf_counter() - started, source="compiled")
+        return _ParsedSchedule(version, SCHEDULE_FILE, user_id, index=index)
+
+    parsed = _ParsedSchedule(version, SCHEDULE_FILE, user_id, frame=_parse_schedule_file(SCHEDULE_FILE, user_id))
+    try:
+        write_compiled(version, parsed.index.iter_lessons())
+    except OSError as e:
+        logging.warning(f"Не удалось сохранить скомпилированное расписание для пользователя {user_id}: {e}")
+    return parsed
+
+
+class _CachedSchedule:
+    __slots__ = ("signature", "parsed")
+
+    def __init__(self, signature: Tuple[int, int], parsed: _ParsedSchedule):
+        self.signature = signature
+        self.parsed = parsed
+
+    @property
+    def index(self) -> ScheduleIndex:
+        return self.parsed.index
+
+
+_cache_lock = threading.RLock()
+_schedule_cache: "OrderedDict[int, _CachedSchedule]" = OrderedDict()
+_parsed_by_version: "weakref.WeakValueDictionary[str, _ParsedSchedule]" = weakref.WeakValueDictionary()
+schedule_cache_stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "shared": 0}
+
+_render_cache: "OrderedDict[Tuple[Optional[str], date, int], str]" = OrderedDict()
+_renders_by_version: Dict[Optional[str], Set[Tuple[Optional[str], date, int]]] = {}
+render_cache_stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+
+cache_events.collect_from(lambda: {
+    **{("schedule", event): value for event, value in schedule_cache_stats.items()},
+    **{("render", event): value for event, value in render_cache_stats.items()},
+})
 
 
 def parse_group_info(grupa_val: str) -> str:
@@ -12,8 +374,7 @@ def parse_group_info(grupa_val: str) -> str:
     if "WykS" in grupa_val:
         return "Wykład"
     elif "Cw" in grupa_val:
-        import re
-        match = re.search(r"Cw(\d+)S", grupa_val)
+        match = _GROUP_NUMBER_RE.search(grupa_val)
         if match:
             return f"Ćwiczenia (grupa {match.group(1)})"
         else:
@@ -21,12 +382,109 @@ def parse_group_info(grupa_val: str) -> str:
     return grupa_val
 
 
-def read_schedule(user_id: int) -> pd.DataFrame:
+def _drop_renders(version: Optional[str]) -> None:
+    for key in _renders_by_version.pop(version, ()):
+        _render_cache.pop(key, None)
+
+
+def carry_over_renders(old_version: Optional[str], new_version: Optional[str], changed_dates: Set[date]) -> int:
+    if old_version is None or new_version is None or old_version == new_version:
+        return 0
+    carried = 0
+    with _cache_lock:
+        for key in list(_renders_by_version.get(old_version, ())):
+            if key[1] in changed_dates:
+                continue
+            text = _render_cache.get(key)
+            new_key = (new_version, key[1], key[2])
+            if text is not None and new_key not in _render_cache:
+                _store_render(new_key, text)
+                carried += 1
+    return carried
+
+
+def release_renders(version: Optional[str]) -> None:
+    with _cache_lock:
+        if not any(other.parsed.version == version for other in _schedule_cache.values()):
+            _drop_renders(version)
+
+
+def invalidate_schedule(user_id: int, keep_renders: bool = False) -> None:
+    with _cache_lock:
+        cached = _schedule_cache.pop(user_id, None)
+        if cached is None or keep_renders:
+            return
+        release_renders(cached.parsed.version)
+
+
+def _load_schedule(user_id: int) -> Optional[_CachedSchedule]:
+    sync_user_schedule(user_id)
     SCHEDULE_FILE = get_user_schedule_file(user_id)
 
-    if not os.path.exists(SCHEDULE_FILE):
-        logging.info(f"Файл расписания для пользователя {user_id} не найден")
+    try:
+        stat = os.stat(SCHEDULE_FILE)
+    except FileNotFoundError:
+        invalidate_schedule(user_id)
+        logging.debug(f"Файл расписания для пользователя {user_id} не найден")
+        return None
+
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        cached = _schedule_cache.get(user_id)
+        if cached is not None and cached.signature == signature:
+            _schedule_cache.move_to_end(user_id)
+            schedule_cache_stats["hits"] += 1
+            return cached
+        schedule_cache_stats["misses"] += 1
+
+    version = file_digest(SCHEDULE_FILE)
+    with _cache_lock:
+        parsed = _parsed_by_version.get(version)
+    if parsed is None:
+        parsed = _parse_versioned(version, SCHEDULE_FILE, user_id)
+    else:
+        schedule_cache_stats["shared"] += 1
+    cached = _CachedSchedule(signature, parsed)
+
+    with _cache_lock:
+        _parsed_by_version.setdefault(version, parsed)
+        _schedule_cache[user_id] = cached
+        _schedule_cache.move_to_end(user_id)
+        while len(_schedule_cache) > SCHEDULE_CACHE_SIZE:
+            _schedule_cache.popitem(last=False)
+            schedule_cache_stats["evictions"] += 1
+
+    return cached
+
+
+def read_schedule(user_id: int) -> "pd.DataFrame":
+    cached = _load_schedule(user_id)
+    if cached is None:
+        import pandas as pd
         return pd.DataFrame()
+    return cached.parsed.frame_for(get_user_schedule_file(user_id))
+
+
+def get_version_index(version: str) -> ScheduleIndex:
+    with _cache_lock:
+        parsed = _parsed_by_version.get(version)
+    if parsed is None:
+        parsed = _parse_versioned(version, get_blob_path(version), 0)
+        with _cache_lock:
+            parsed = _parsed_by_version.setdefault(version, parsed)
+    return parsed.index
+
+
+def get_schedule_index(user_id: int) -> ScheduleIndex:
+    cached = _load_schedule(user_id)
+    if cached is None:
+        return ScheduleIndex({})
+    return cached.index
+
+
+@timed(parse_seconds, source="csv")
+def _parse_schedule_file(SCHEDULE_FILE: str, user_id: int) -> "pd.DataFrame":
+    import pandas as pd
 
     try:
         df = pd.read_csv(SCHEDULE_FILE, sep=';', skiprows=2, header=None, skipinitialspace=True)
@@ -39,7 +497,7 @@ def read_schedule(user_id: int) -> pd.DataFrame:
         return pd.DataFrame()
 
     n_cols = df.shape[1]
-    logging.info(f"Количество колонок в файле пользователя {user_id}: {n_cols}")
+    logging.debug(f"Количество колонок в файле пользователя {user_id}: {n_cols}")
 
     default_cols = ["temp0", "Czas od", "Czas do", "Liczba godzin", "Grupy",
                     "Zajecia", "Sala", "Forma zaliczenia", "Uwagi", "temp_extra"]
@@ -51,74 +509,55 @@ def read_schedule(user_id: int) -> pd.DataFrame:
 
     df.columns = col_names
 
-    current_date = None
-    dates = []
-    for _, row in df.iterrows():
-        first_col = str(row.iloc[0]).strip() if pd.notna(row.iloc[0]) else ""
-        if first_col.startswith("Data Zajec"):
-            try:
-                parts = first_col.split()
-                current_date = datetime.strptime(parts[2], "%Y.%m.%d").date()
-            except Exception as e:
-                logging.warning(f"Не удалось распарсить дату '{first_col}' для пользователя {user_id}: {e}")
-                current_date = None
-            dates.append(None)
-        else:
-            dates.append(current_date)
+    first_col = df.iloc[:, 0].where(df.iloc[:, 0].notna(), "").astype(str).str.strip()
+    is_header = first_col.str.startswith("Data Zajec")
 
-    df["Data_dt"] = dates
+    header_dates = pd.to_datetime(first_col[is_header].str.split().str[2], format="%Y.%m.%d", errors="coerce")
+    for bad in first_col[is_header][header_dates.isna()]:
+        logging.warning(f"Не удалось распарсить дату '{bad}' для пользователя {user_id}")
+
+    block = is_header.cumsum()
+    date_by_block = pd.Series(header_dates.dt.date.to_numpy(), index=block[is_header].to_numpy())
+    df["Data_dt"] = block.map(date_by_block).where(~is_header, None)
 
     if "Czas od" in df.columns:
         df["Czas od"] = df["Czas od"].astype(str).str.strip()
+        df["Czas_od_td"] = _parse_times(df["Czas od"])
     else:
         logging.warning(f"В файле пользователя {user_id} отсутствует колонка 'Czas od'")
 
+    if "Czas do" in df.columns:
+        df["Czas_do_td"] = _parse_times(df["Czas do"].astype(str).str.strip())
+
     df = df[df['Data_dt'].notna() & df['Czas od'].notna()].copy()
-    logging.info(f"После фильтров строк для пользователя {user_id}: {len(df)}")
+    logging.debug(f"После фильтров строк для пользователя {user_id}: {len(df)}")
 
     return df
 
 
-def format_schedule(df: pd.DataFrame, title: str, user_id: int) -> str:
-    if df.empty:
-        return f"{title} пусто 📭"
+def _parse_times(values: "pd.Series") -> "pd.Series":
+    import pandas as pd
+    return pd.to_timedelta(values + ":00", errors="coerce")
 
-    group_num = user_groups.get(user_id, 0)
-    if group_num > 0 and "Grupy" in df.columns:
-        def belongs_to_group(grupa_val: str) -> bool:
-            if not isinstance(grupa_val, str):
-                return False
-            grupa_val = grupa_val.strip()
-            if "WykS" in grupa_val:
-                return True
-            return f"Cw{group_num}S" in grupa_val
 
-        df = df[df["Grupy"].apply(belongs_to_group)]
+DAYS_MAP = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
 
-    if df.empty:
-        return f"{title} (после фильтра) пусто 📭"
 
+def render_days(days: Iterable[Tuple[date, Sequence[Lesson]]], title: str) -> str:
     lines = [f"📅 {title}:\n"]
-    days_map = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
 
-    for date, group in df.groupby("Data_dt"):
-        day_of_week = days_map[date.weekday()]
-        lines.append(f"🗓️ {day_of_week}, {date:%d.%m.%Y}")
+    for day, lessons in days:
+        lines.append(f"🗓️ {DAYS_MAP[day.weekday()]}, {day:%d.%m.%Y}")
         lines.append('')
 
-        group = group.copy()
-        group['czas_od_dt'] = pd.to_datetime(group['Czas od'], format="%H:%M", errors='coerce')
+        for lesson in lessons:
+            lines.append(f"⏰ {lesson.czas_od} - {lesson.czas_do}")
+            lines.append(f"👥 {parse_group_info(lesson.grupy)}")
+            lines.append(f"📖 {lesson.zajecia}")
+            lines.append(f"🏫 {lesson.sala}")
 
-        for _, row in group.sort_values(by='czas_od_dt').iterrows():
-            zajecia_type = parse_group_info(row.get("Grupy", ""))
-            lines.append(f"⏰ {row['Czas od']} - {row['Czas do']}")
-            lines.append(f"👥 {zajecia_type}")
-            lines.append(f"📖 {row['Zajecia']}")
-            lines.append(f"🏫 {row['Sala']}")
-
-            uwagi = str(row.get('Uwagi', '')).strip()
-            if uwagi and uwagi.lower() != 'nan':
-                lines.append(f"📝 {uwagi}")
+            if lesson.uwagi:
+                lines.append(f"📝 {lesson.uwagi}")
 
             lines.append("")
         lines.append("")
@@ -126,9 +565,135 @@ def format_schedule(df: pd.DataFrame, title: str, user_id: int) -> str:
     return "\n".join(lines)
 
 
-def get_schedule_data_for_day(date: date, user_id: int) -> str:
-    df = read_schedule(user_id)
+def format_schedule(df: "pd.DataFrame", title: str, user_id: int) -> str:
     if df.empty:
+        return f"{title} пусто 📭"
+
+    days = ScheduleIndex.from_frame(df).for_group(user_groups.get(user_id, 0))
+    if not days:
+        return f"{title} (после фильтра) пусто 📭"
+
+    return render_days(sorted(days.items()), title)
+
+
+def format_day(index: ScheduleIndex, day: date, user_id: int) -> str:
+    key = (index.version, day, user_groups.get(user_id, 0))
+    if index.version is not None:
+        with _cache_lock:
+            text = _render_cache.get(key)
+            if text is not None:
+                _render_cache.move_to_end(key)
+                render_cache_stats["hits"] += 1
+                return text
+
+    render_cache_stats["misses"] += 1
+    with render_seconds.time():
+        text = _render_day(index, day, key[2])
+    if index.version is None:
+        return text
+
+    with _cache_lock:
+        _store_render(key, text)
+    return text
+
+
+def _store_render(key: Tuple[Optional[str], date, int], text: str) -> None:
+    _render_cache[key] = text
+    _renders_by_version.setdefault(key[0], set()).add(key)
+    while len(_render_cache) > RENDER_CACHE_SIZE:
+        old_key, _ = _render_cache.popitem(last=False)
+        keys = _renders_by_version.get(old_key[0])
+        if keys is not None:
+            keys.discard(old_key)
+            if not keys:
+                del _renders_by_version[old_key[0]]
+        render_cache_stats["evictions"] += 1
+
+
+def _render_day(index: ScheduleIndex, day: date, group_num: int) -> str:
+    title = f"Расписание на {day:%d.%m.%Y}"
+    if day not in index.by_date:
+        return f"{title} пусто 📭"
+
+    lessons = index.lessons_for(day, group_num)
+    if not lessons:
+        return f"{title} (после фильтра) пусто 📭"
+
+    return render_days([(day, lessons)], title)
+
+
+def get_schedule_data_for_day(date: date, user_id: int) -> str:
+    index = get_schedule_index(user_id)
+    if not index:
         return "❌ Ваш файл расписания не найден или пуст."
-    day_df = df[df['Data_dt'] == date]
-    return format_schedule(day_df, f"Расписание на {date:%d.%m.%Y}", user_id)
+    return format_day(index, date, user_id)
+
+
+def month_bounds(day: date) -> Tuple[date, date]:
+    first_day = day.replace(day=1)
+    if first_day.month == 12:
+        next_month = first_day.replace(year=first_day.year + 1, month=1)
+    else:
+        next_month = first_day.replace(month=first_day.month + 1)
+    return first_day, next_month - timedelta(days=1)
+
+
+def get_day_view(user_id: int, day: date, min_date: date, max_date: date) -> DayView:
+    index = get_schedule_index(user_id)
+    if not index:
+        return DayView(day, "❌ Ваш файл расписания не найден или пуст.", None, None)
+
+    days = index.days_for_group(user_groups.get(user_id, 0))
+    before = bisect_left(days, day)
+    after = bisect_right(days, day)
+    prev_day = days[before - 1] if before > 0 and days[before - 1] >= min_date else None
+    next_day = days[after] if after < len(days) and days[after] <= max_date else None
+
+    return DayView(day, format_day(index, day, user_id), prev_day, next_day)
+
+
+def get_month_view(user_id: int, day: date) -> DayView:
+    first_day, last_day = month_bounds(day)
+    index = get_schedule_index(user_id)
+    if not index:
+        return DayView(first_day, "❌ Ваш файл расписания не найден или пуст.", None, None)
+
+    days = index.days_for_group(user_groups.get(user_id, 0))
+    month_days = days[bisect_left(days, first_day):bisect_right(days, last_day)]
+    for lesson_day in month_days:
+        format_day(index, lesson_day, user_id)
+
+    start = month_days[0] if month_days else first_day
+    return get_day_view(user_id, start, first_day, last_day)
+
+
+async def load_schedule_index(user_id: int) -> ScheduleIndex:
+    return await run_blocking(("index", user_id), get_schedule_index, user_id)
+
+
+async def load_version_index(version: str) -> ScheduleIndex:
+    return await run_blocking(("version", version), get_version_index, version)
+
+
+async def warm_up_schedules(user_ids: Iterable[int], concurrency: int) -> int:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def warm(user_id: int) -> bool:
+        async with semaphore:
+            try:
+                return bool(await load_schedule_index(user_id))
+            except Exception as e:
+                logging.warning(f"Не удалось прогреть расписание пользователя {user_id}: {e}")
+                return False
+
+    return sum(await asyncio.gather(*(warm(user_id) for user_id in user_ids)))
+
+
+async def load_day_view(user_id: int, day: date, min_date: date, max_date: date) -> DayView:
+    key = ("day", user_id, day, min_date, max_date, user_groups.get(user_id, 0))
+    return await run_blocking(key, get_day_view, user_id, day, min_date, max_date)
+
+
+async def load_month_view(user_id: int, day: date) -> DayView:
+    key = ("month", user_id, day, user_groups.get(user_id, 0))
+    return await run_blocking(key, get_month_view, user_id, day)
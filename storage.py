@@ -1,10 +1,128 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from typing import Dict
-from .config import USER_SCHEDULES_DIR
+import shutil
+import time
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Mapping, Optional, Set
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from .backends import StateBackend, create_backend
+from .binformat import get_compiled_path
+from .config import BLOB_GC_MIN_AGE, FSM_STATE_TTL, SCHEDULE_BLOBS_DIR, SETTINGS_CACHE_TTL, USER_SCHEDULES_DIR
 
+_DELETED = object()
 
-user_groups: Dict[int, int] = {}
-user_notifications: Dict[int, bool] = {}
+
+class PersistentDict(MutableMapping):
+    def __init__(self, store: StateBackend, key: str, max_age: float = SETTINGS_CACHE_TTL):
+        self._store = store
+        self._key = key
+        self._max_age = max_age
+        self._data: Optional[Dict[int, Any]] = None
+        self._loaded_at = 0.0
+        self._reload: Optional[asyncio.Task] = None
+        self._written: Dict[int, Any] = {}
+
+    @property
+    def data(self) -> Dict[int, Any]:
+        if self._data is None:
+            self._data = self._store.load(self._key)
+            self._loaded_at = time.monotonic()
+        elif self._max_age and self._reload is None and time.monotonic() - self._loaded_at > self._max_age:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._data = self._store.load(self._key)
+                self._loaded_at = time.monotonic()
+            else:
+                self._written = {}
+                self._reload = loop.create_task(self._reload_async())
+        return self._data
+
+    async def _reload_async(self) -> None:
+        try:
+            data = await self._store.load_async(self._key)
+            for user_id, value in self._written.items():
+                if value is _DELETED:
+                    data.pop(user_id, None)
+                else:
+                    data[user_id] = value
+            self._data = data
+        except Exception as e:
+            logging.warning(f"Не удалось перечитать настройки {self._key}: {e}")
+        finally:
+            self._loaded_at = time.monotonic()
+            self._reload = None
+
+    def __getitem__(self, user_id: int) -> Any:
+        return self.data[user_id]
+
+    def __setitem__(self, user_id: int, value: Any) -> None:
+        self.data[user_id] = value
+        if self._reload is not None:
+            self._written[user_id] = value
+        self._store.put(user_id, self._key, value)
+
+    def __delitem__(self, user_id: int) -> None:
+        del self.data[user_id]
+        if self._reload is not None:
+            self._written[user_id] = _DELETED
+        self._store.delete(user_id, self._key)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        return f"PersistentDict({self._key!r}, {self.data!r})"
+
+
+class BackendStorage(BaseStorage):
+    def __init__(self, backend: StateBackend, ttl: float = FSM_STATE_TTL):
+        self._backend = backend
+        self._ttl = ttl
+
+    @staticmethod
+    def _key(key: StorageKey, part: str) -> str:
+        return f"fsm:{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or 0}:{key.destiny}:{part}"
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        state = state.state if isinstance(state, State) else state
+        if state is None:
+            await self._backend.delete_value_async(self._key(key, "state"))
+        else:
+            await self._backend.set_value_async(self._key(key, "state"), state, self._ttl)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._backend.get_value_async(self._key(key, "state"))
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if data:
+            await self._backend.set_value_async(self._key(key, "data"), json.dumps(dict(data)), self._ttl)
+        else:
+            await self._backend.delete_value_async(self._key(key, "data"))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        value = await self._backend.get_value_async(self._key(key, "data"))
+        return json.loads(value) if value else {}
+
+    async def close(self) -> None:
+        self._backend.flush()
+
+
+state_backend = create_backend()
+fsm_storage = BackendStorage(state_backend)
+
+user_groups: PersistentDict = PersistentDict(state_backend, "group")
+user_notifications: PersistentDict = PersistentDict(state_backend, "notifications")
+user_sources: PersistentDict = PersistentDict(state_backend, "source_url")
+user_digest_hours: PersistentDict = PersistentDict(state_backend, "digest_hour")
+user_schedule_versions: PersistentDict = PersistentDict(state_backend, "schedule_version")
 
 
 def ensure_user_dir() -> None:
@@ -14,3 +132,93 @@ def ensure_user_dir() -> None:
 def get_user_schedule_file(user_id: int) -> str:
     ensure_user_dir()
     return os.path.join(USER_SCHEDULES_DIR, f"{user_id}.csv")
+
+
+def get_blob_path(digest: str) -> str:
+    os.makedirs(SCHEDULE_BLOBS_DIR, exist_ok=True)
+    return os.path.join(SCHEDULE_BLOBS_DIR, f"{digest}.csv")
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def store_blob(src_path: str, digest: Optional[str] = None) -> str:
+    digest = digest or file_digest(src_path)
+    blob_path = get_blob_path(digest)
+    if os.path.exists(blob_path):
+        os.remove(src_path)
+        os.utime(blob_path)
+    else:
+        os.replace(src_path, blob_path)
+        fsync_dir(SCHEDULE_BLOBS_DIR)
+    state_backend.put_blob(digest, blob_path)
+    return digest
+
+
+def collect_unused_blobs(referenced: Set[str], min_age: float = BLOB_GC_MIN_AGE) -> int:
+    if not os.path.isdir(SCHEDULE_BLOBS_DIR):
+        return 0
+    cutoff = time.time() - min_age
+    removed = 0
+    for name in os.listdir(SCHEDULE_BLOBS_DIR):
+        digest, ext = os.path.splitext(name)
+        if ext != ".csv" or digest in referenced:
+            continue
+        try:
+            if os.stat(os.path.join(SCHEDULE_BLOBS_DIR, name)).st_mtime > cutoff:
+                continue
+            os.remove(os.path.join(SCHEDULE_BLOBS_DIR, name))
+        except FileNotFoundError:
+            continue
+        try:
+            os.remove(get_compiled_path(digest))
+        except FileNotFoundError:
+            pass
+        state_backend.delete_blob(digest)
+        removed += 1
+    return removed
+
+
+def link_user_schedule(user_id: int, digest: str) -> str:
+    file_path = get_user_schedule_file(user_id)
+    tmp_path = f"{file_path}.link"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(get_blob_path(digest), tmp_path)
+    except OSError:
+        shutil.copyfile(get_blob_path(digest), tmp_path)
+    os.replace(tmp_path, file_path)
+    if user_schedule_versions.get(user_id) != digest:
+        user_schedule_versions[user_id] = digest
+    return file_path
+
+
+def sync_user_schedule(user_id: int) -> None:
+    if not state_backend.remote_blobs:
+        return
+    digest = user_schedule_versions.get(user_id)
+    if digest is None:
+        return
+    file_path = get_user_schedule_file(user_id)
+    blob_path = get_blob_path(digest)
+    try:
+        if os.path.samefile(file_path, blob_path):
+            return
+    except OSError:
+        pass
+    if state_backend.fetch_blob(digest, blob_path):
+        link_user_schedule(user_id, digest)
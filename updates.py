@@ -0,0 +1,32 @@
+import logging
+import time
+
+from .notifier import reminder_scheduler
+from .schedules import (ScheduleDiff, ScheduleIndex, carry_over_renders, diff_schedules, format_changes,
+                        release_renders)
+from .storage import user_groups
+
+
+def apply_schedule_update(user_id: int, old: ScheduleIndex, new: ScheduleIndex) -> ScheduleDiff:
+    started = time.perf_counter()
+    changes = diff_schedules(old, new)
+    carried = 0
+    if old.version != new.version:
+        new.adopt_unchanged(old, changes.dates)
+        carried = carry_over_renders(old.version, new.version, changes.dates)
+        release_renders(old.version)
+    if changes:
+        reminder_scheduler.update_user(user_id, changes, new)
+    logging.info(f"Обновление расписания пользователя {user_id}: +{len(changes.added)} -{len(changes.removed)} "
+                 f"~{len(changes.changed)}, затронуто дней {len(changes.dates)}, перенесено рендеров {carried}, "
+                 f"{(time.perf_counter() - started) * 1000:.1f} ms")
+    return changes
+
+
+def summarize_update(user_id: int, old: ScheduleIndex, changes: ScheduleDiff) -> str:
+    if not old:
+        return ""
+    visible = changes.for_group(user_groups.get(user_id, 0))
+    if not visible:
+        return "Изменений в расписании нет."
+    return format_changes(visible)
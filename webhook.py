@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import secrets
+from typing import Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from .config import (
+    HEALTH_PORT,
+    MAX_CONCURRENT_UPDATES,
+    SHUTDOWN_TIMEOUT,
+    WEBHOOK_HOST,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_URL,
+)
+from .metrics import updates_in_flight
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class UpdateGate:
+    def __init__(self, limit: int = MAX_CONCURRENT_UPDATES):
+        self._semaphore = asyncio.Semaphore(limit)
+        self._tasks: Set[asyncio.Task] = set()
+        self.draining = False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def submit(self, dp: Dispatcher, bot: Bot, update: Update) -> None:
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._handle(dp, bot, update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, dp: Dispatcher, bot: Bot, update: Update) -> None:
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            logging.exception(f"Ошибка обработки update {update.update_id}: {e}")
+        finally:
+            self._semaphore.release()
+
+    async def drain(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        self.draining = True
+        if not self._tasks:
+            return
+        logging.info(f"Ожидание завершения {len(self._tasks)} обработчиков...")
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logging.warning(f"Прервано {len(pending)} обработчиков по таймауту")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def create_app(dp: Dispatcher, bot: Bot, gate: UpdateGate) -> web.Application:
+    async def handle_update(request: web.Request) -> web.Response:
+        if gate.draining:
+            return web.Response(status=503)
+        if WEBHOOK_SECRET and not secrets.compare_digest(request.headers.get(SECRET_HEADER, ""), WEBHOOK_SECRET):
+            return web.Response(status=401)
+        update = Update.model_validate(await request.json(), context={"bot": bot})
+        await gate.submit(dp, bot, update)
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        status = 503 if gate.draining else 200
+        return web.json_response({"status": "draining" if gate.draining else "ok", "in_flight": gate.in_flight},
+                                 status=status)
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    app.router.add_get("/health", health)
+    app.router.add_get("/", health)
+    return app
+
+
+async def start_health_server(host: str = WEBHOOK_HOST, port: int = HEALTH_PORT) -> Optional[web.AppRunner]:
+    if not port:
+        return None
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "mode": "polling"})
+
+    app = web.Application()
+    app.router.add_get("/health", health)
+    app.router.add_get("/", health)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Health check доступен на http://{host}:{port}/health")
+    return runner
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, stop: asyncio.Event) -> None:
+    gate = UpdateGate()
+    updates_in_flight.collect_from(lambda: {(): gate.in_flight})
+    runner = web.AppRunner(create_app(dp, bot, gate))
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    logging.info(f"Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    await bot.set_webhook(
+        WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET or None,
+        max_connections=MAX_CONCURRENT_UPDATES,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    await dp.emit_startup(bot=bot)
+    try:
+        await stop.wait()
+    finally:
+        await gate.drain()
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot)